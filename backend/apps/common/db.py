@@ -0,0 +1,27 @@
+import time
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class WriteQueryTimer:
+    """Database execute wrapper that adds up the time spent in write queries.
+
+    Usage:
+        timer = WriteQueryTimer()
+        with connection.execute_wrapper(timer):
+            ...
+        timer.elapsed
+    """
+
+    def __init__(self) -> None:
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.elapsed += time.perf_counter() - start
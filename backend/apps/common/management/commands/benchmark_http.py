@@ -0,0 +1,139 @@
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import SplitResult, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from apps.accounts.models import User
+from apps.questions.telemetry import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent requests to a running server and report the requests per second. "
+        "Used to compare the serving setups, see the README."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Ex: http://localhost:8000/dashboard/")
+        parser.add_argument("--concurrency", type=int, default=10, help="Clients in parallel.")
+        parser.add_argument("--duration", type=float, default=10, help="Seconds to run.")
+        parser.add_argument(
+            "--email", help="Log in as this user, for the pages that require authentication."
+        )
+        parser.add_argument(
+            "--slow-url",
+            help="Streaming URL kept open by the slow clients during the run. "
+            "Ex: the events of a pending question set.",
+        )
+        parser.add_argument("--slow-clients", type=int, default=0)
+
+    def _path(self, url: SplitResult) -> str:
+        return (url.path or "/") + (f"?{url.query}" if url.query else "")
+
+    def _slow_client(self, url: SplitResult, headers: dict, deadline: float) -> None:
+        """Hold a streaming response open until the end of the run, like an open page."""
+
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=5)
+        try:
+            connection.request("GET", self._path(url), headers=headers)
+            response = connection.getresponse()
+            while time.perf_counter() < deadline:
+                try:
+                    if not response.readline():
+                        break
+                except TimeoutError:
+                    continue
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+
+    def _worker(
+        self,
+        url: SplitResult,
+        headers: dict,
+        deadline: float,
+        latencies: list,
+        errors: list,
+        lock: threading.Lock,
+    ) -> None:
+        # Keep the connection open between the requests, like a browser
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        path = self._path(url)
+
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http":
+            raise CommandError("Only http URLs are supported")
+
+        headers = {"Host": url.netloc}
+        if options["email"]:
+            # Sessions are shared with the server through the database and the cache
+            user = User.objects.filter(email=options["email"]).first()
+            if user is None:
+                raise CommandError(f"User {options['email']} not found")
+            client = Client()
+            client.force_login(user)
+            headers["Cookie"] = f"sessionid={client.cookies['sessionid'].value}"
+
+        slow_threads = []
+        if options["slow_url"] and options["slow_clients"]:
+            slow_url = urlsplit(options["slow_url"])
+            slow_deadline = time.perf_counter() + options["duration"] + 2
+            slow_threads = [
+                threading.Thread(target=self._slow_client, args=(slow_url, headers, slow_deadline))
+                for _ in range(options["slow_clients"])
+            ]
+            for thread in slow_threads:
+                thread.start()
+            # Let the streams start before measuring
+            time.sleep(1)
+
+        latencies: list[float] = []
+        errors: list[float] = []
+        lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = start + options["duration"]
+        threads = [
+            threading.Thread(
+                target=self._worker, args=(url, headers, deadline, latencies, errors, lock)
+            )
+            for _ in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        for thread in slow_threads:
+            thread.join()
+
+        latencies.sort()
+        if slow_threads:
+            self.stdout.write(f"Slow clients: {len(slow_threads)}")
+        self.stdout.write(f"Requests: {len(latencies)} ({len(errors)} errors)")
+        self.stdout.write(f"Throughput: {len(latencies) / elapsed:.1f} requests/s")
+        if latencies:
+            self.stdout.write(
+                f"Latency: mean {statistics.mean(latencies) * 1000:.1f} ms, "
+                f"p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+                f"p95 {percentile(latencies, 95) * 1000:.1f} ms"
+            )
@@ -0,0 +1,41 @@
+import threading
+
+import markdown
+
+_local = threading.local()
+
+
+def _get_renderer() -> markdown.Markdown:
+    """Building the pipeline is slow, so each thread reuses its own instance."""
+
+    if not hasattr(_local, "renderer"):
+        _local.renderer = markdown.Markdown(
+            extensions=[
+                "fenced_code",  # Allow ```code blocks```
+                "codehilite",  # syntax highlight with Pygments
+                "tables",
+                "toc",
+                "sane_lists",
+            ],
+            extension_configs={
+                "codehilite": {
+                    "linenums": False,
+                    "css_class": "highlight",
+                }
+            },
+            output_format="html",
+        )
+    return _local.renderer
+
+
+def render_markdown(text: str | None) -> str:
+    """Render the markdown of the generated content to HTML.
+    The result is stored with the content, see the `markdown` template filters.
+    """
+
+    renderer = _get_renderer()
+    renderer.reset()
+    html = renderer.convert(text or "")
+
+    # Apply Bootstrap styles
+    return html.replace("<table>", '<table class="table table-bordered">')
@@ -0,0 +1,25 @@
+import asyncio
+import weakref
+from functools import cache
+
+from django.conf import settings
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRedis] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@cache
+def get_redis() -> Redis:
+    """Shared Redis connection pool of the process."""
+    return Redis.from_url(settings.REDIS_URL)
+
+
+def get_async_redis() -> AsyncRedis:
+    """Shared async Redis client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = AsyncRedis.from_url(settings.REDIS_URL)
+    return _async_clients[loop]
@@ -1,31 +1,34 @@
-import markdown
 from django import template
 from django.utils.safestring import mark_safe
 
+from apps.common.markdown import render_markdown
+from apps.questions.models import Question
+
 register = template.Library()
 
 
 @register.filter(name="markdown")
 def markdown_format(text):
-    html = markdown.markdown(
-        text or "",
-        extensions=[
-            "fenced_code",  # Allow ```code blocks```
-            "codehilite",  # syntax highlight with Pygments
-            "tables",
-            "toc",
-            "sane_lists",
-        ],
-        extension_configs={
-            "codehilite": {
-                "linenums": False,
-                "css_class": "highlight",
-            }
-        },
-        output_format="html",
-    )
-
-    # Apply Bootstrap styles
-    html = html.replace("<table>", '<table class="table table-bordered">')
+    return mark_safe(render_markdown(text))
+
+
+@register.filter
+def question_text(question: Question, number: int | None = None) -> str:
+    """HTML of the question text, rendered live if it wasn't stored yet.
+    The number is placed in the first paragraph, like the text was written "1. ...".
+    """
 
+    html = question.text_html or render_markdown(question.text)
+    if number is not None:
+        if html.startswith("<p>"):
+            html = f"<p>{number}. {html[3:]}"
+        else:
+            html = f"<p>{number}.</p>{html}"
     return mark_safe(html)
+
+
+@register.filter
+def question_explanation(question: Question) -> str:
+    """HTML of the question explanation, rendered live if it wasn't stored yet."""
+
+    return mark_safe(question.explanation_html or render_markdown(question.explanation))
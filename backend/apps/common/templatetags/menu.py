@@ -36,9 +36,11 @@ def nav_link(
     }
 
 
-@register.inclusion_tag("components/nav_link.html", takes_context=True)
-def question_set_nav_link(context: dict, question_set: QuestionSet):
-    request = context["request"]
+@register.inclusion_tag("components/nav_link.html")
+def question_set_nav_link(question_set: QuestionSet):
+    """Link of a set in the sidebar. It is cached for all the pages, so it doesn't depend
+    on the request.
+    """
 
     url = reverse("question_set", kwargs={"question_set_id": question_set.id})
     actions = [
@@ -55,12 +57,11 @@ def question_set_nav_link(context: dict, question_set: QuestionSet):
         },
     ]
 
-    active = " active" if request.path == url else ""
     context = {
         "label": question_set.title,
         "url": url,
         "actions": actions,
-        "active": active,
+        "cached": True,
     }
 
     if question_set.pinned_at:
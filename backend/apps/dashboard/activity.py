@@ -0,0 +1,124 @@
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.questions.models import PracticeSession
+
+from .models import DailyActivity
+
+log = logging.getLogger(__name__)
+
+FIELDS = ["practices_count", "practice_time", "answered_count", "correct_count"]
+
+
+def _empty() -> dict:
+    return {
+        "practices_count": 0,
+        "practice_time": timedelta(),
+        "answered_count": 0,
+        "correct_count": 0,
+    }
+
+
+def _totals(sessions: Iterable[PracticeSession]) -> dict[date, dict]:
+    """Values of finished sessions by the date they were finished."""
+
+    days = defaultdict(_empty)
+    for session in sessions:
+        day = days[timezone.localdate(session.finished_at)]
+        day["practices_count"] += 1
+        day["practice_time"] += session.duration or timedelta()
+        day["answered_count"] += session.answered_count
+        day["correct_count"] += session.correct_count or 0
+    return days
+
+
+def record(user_id: int, sessions: Iterable[PracticeSession], sign: int = 1) -> None:
+    """Add the finished sessions to the activity of the user, or remove them with sign=-1.
+    Only inserts rows, so it never waits for the row of the day.
+    """
+
+    DailyActivity.objects.bulk_create(
+        DailyActivity(
+            user_id=user_id,
+            date=day,
+            **{field: value * sign for field, value in values.items()},
+        )
+        for day, values in _totals(sessions).items()
+    )
+
+
+def rebuild(user_id: int, sessions: Iterable[PracticeSession]) -> None:
+    """Replace the activity of the user by the one of its finished sessions."""
+
+    with transaction.atomic():
+        DailyActivity.objects.filter(user_id=user_id).delete()
+        DailyActivity.objects.bulk_create(
+            DailyActivity(user_id=user_id, date=day, compacted=True, **values)
+            for day, values in _totals(sessions).items()
+        )
+
+
+def _compact_day(user_id: int, day: date) -> None:
+    with transaction.atomic():
+        rows = list(
+            DailyActivity.objects.select_for_update().filter(user_id=user_id, date=day).order_by()
+        )
+        if not rows:
+            return
+        if len(rows) == 1:
+            DailyActivity.objects.filter(id=rows[0].id).update(compacted=True)
+            return
+
+        merged = DailyActivity(user_id=user_id, date=day, compacted=True)
+        for field in FIELDS:
+            # Starting from the zero of the field
+            total = sum((getattr(row, field) for row in rows), getattr(merged, field))
+            setattr(merged, field, total)
+        DailyActivity.objects.filter(id__in=[row.id for row in rows]).delete()
+        merged.save()
+
+
+def compact(limit: int = 1000) -> int:
+    """Merge the rows of the same user and day, up to `limit` user-days, the oldest first.
+    Returns the number of compacted days.
+    """
+
+    days = list(
+        DailyActivity.objects.filter(compacted=False)
+        .values_list("user_id", "date")
+        .distinct()
+        .order_by("date")[:limit]
+    )
+    for user_id, day in days:
+        try:
+            _compact_day(user_id, day)
+        except Exception as e:
+            log.exception(f"Error compacting the activity of user {user_id} on {day}: {e}")
+    return len(days)
+
+
+def get(user_id: int, start: date, end: date) -> list[dict]:
+    """Activity of each day between `start` and `end`, with the days without practices.
+    One range query on the (user, date) index, whether the rows were compacted or not.
+    """
+
+    rows = (
+        DailyActivity.objects.filter(user_id=user_id, date__range=(start, end))
+        .values("date")
+        .annotate(**{f"total_{field}": Sum(field) for field in FIELDS})
+        .order_by("date")
+    )
+    by_date = {row["date"]: {field: row[f"total_{field}"] for field in FIELDS} for row in rows}
+
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        row = by_date.get(day) or _empty()
+        days.append({"date": day, **{field: row[field] for field in FIELDS}})
+    return days
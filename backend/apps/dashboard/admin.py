@@ -0,0 +1,35 @@
+from django.contrib import admin
+
+from apps.common.admin import BaseDBModelAdmin
+
+from .models import DailyActivity, UserStats
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(BaseDBModelAdmin):
+    list_display = [
+        "id",
+        "user",
+        "questions_count",
+        "practices_count",
+        "practice_time",
+        "answered_count",
+        "correct_count",
+    ]
+    search_fields = ["user__email"]
+
+
+@admin.register(DailyActivity)
+class DailyActivityAdmin(BaseDBModelAdmin):
+    list_display = [
+        "id",
+        "user",
+        "date",
+        "practices_count",
+        "practice_time",
+        "answered_count",
+        "correct_count",
+        "compacted",
+    ]
+    list_filter = ["compacted"]
+    search_fields = ["user__email"]
@@ -5,3 +5,6 @@ class DashboardConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.dashboard"
     verbose_name = "Dashboard"
+
+    def ready(self):
+        from . import signals  # noqa: F401
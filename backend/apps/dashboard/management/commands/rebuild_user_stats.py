@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import User
+from apps.dashboard import stats
+
+
+class Command(BaseCommand):
+    help = "Compute again the dashboard stats of the users from their questions and practices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", help="Rebuild only the stats of this user.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("id")
+        if options["email"]:
+            users = users.filter(email=options["email"])
+
+        total = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            stats.rebuild(user_id)
+            total += 1
+            if total % 100 == 0:
+                self.stdout.write(f"{total} users rebuilt")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} users rebuilt"))
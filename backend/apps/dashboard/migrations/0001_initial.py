@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:55
+
+import datetime
+import django.db.models.deletion
+import django_ulidfield.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', django_ulidfield.fields.ULIDField(default=django_ulidfield.fields.generate_ulid, editable=False, max_length=26, primary_key=True, serialize=False, unique=True, validators=[django_ulidfield.fields.validate_ulid])),
+                ('questions_count', models.PositiveIntegerField(default=0, verbose_name='Questões')),
+                ('practices_count', models.PositiveIntegerField(default=0, verbose_name='Práticas')),
+                ('practice_time', models.DurationField(default=datetime.timedelta, verbose_name='Tempo de prática')),
+                ('answered_count', models.PositiveIntegerField(default=0, verbose_name='Respondidas')),
+                ('correct_count', models.PositiveIntegerField(default=0, verbose_name='Acertos')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Estatística do usuário',
+                'verbose_name_plural': 'Estatísticas dos usuários',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:56
+
+import datetime
+import django.db.models.deletion
+import django_ulidfield.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', django_ulidfield.fields.ULIDField(default=django_ulidfield.fields.generate_ulid, editable=False, max_length=26, primary_key=True, serialize=False, unique=True, validators=[django_ulidfield.fields.validate_ulid])),
+                ('date', models.DateField(verbose_name='Data')),
+                ('practices_count', models.IntegerField(default=0, verbose_name='Práticas')),
+                ('practice_time', models.DurationField(default=datetime.timedelta, verbose_name='Tempo de prática')),
+                ('answered_count', models.IntegerField(default=0, verbose_name='Respondidas')),
+                ('correct_count', models.IntegerField(default=0, verbose_name='Acertos')),
+                ('compacted', models.BooleanField(default=False, verbose_name='Compactado')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Atividade diária',
+                'verbose_name_plural': 'Atividades diárias',
+                'indexes': [models.Index(fields=['user', 'date'], name='dashboard_d_user_id_42f9af_idx'), models.Index(fields=['compacted'], name='dashboard_d_compact_5f5975_idx')],
+            },
+        ),
+    ]
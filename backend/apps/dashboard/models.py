@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.db import models
+
+from apps.accounts.models import User
+from apps.common.models import BaseDBModel
+
+
+class UserStats(BaseDBModel):
+    """Totals shown in the dashboard, updated by the generations and the practices.
+    Rebuilt from the questions and sessions with `manage.py rebuild_user_stats`.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="stats", verbose_name="Usuário"
+    )
+    questions_count = models.PositiveIntegerField(verbose_name="Questões", default=0)
+    practices_count = models.PositiveIntegerField(verbose_name="Práticas", default=0)
+    practice_time = models.DurationField(verbose_name="Tempo de prática", default=timedelta)
+    # Questions of the finished practices
+    answered_count = models.PositiveIntegerField(verbose_name="Respondidas", default=0)
+    correct_count = models.PositiveIntegerField(verbose_name="Acertos", default=0)
+
+    class Meta:
+        verbose_name = "Estatística do usuário"
+        verbose_name_plural = "Estatísticas dos usuários"
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+    @property
+    def score(self) -> float:
+        return self.correct_count / self.answered_count * 100 if self.answered_count else 0
+
+
+class DailyActivity(BaseDBModel):
+    """Practices finished by a user in a day, by the date they were finished.
+
+    Each finished practice adds a row, and the rows of the same day are merged by the
+    `compact_daily_activity_task` beat task. The values can be negative in the rows
+    not compacted yet, when a question set is deleted.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="daily_activity", verbose_name="Usuário"
+    )
+    date = models.DateField(verbose_name="Data")
+    practices_count = models.IntegerField(verbose_name="Práticas", default=0)
+    practice_time = models.DurationField(verbose_name="Tempo de prática", default=timedelta)
+    answered_count = models.IntegerField(verbose_name="Respondidas", default=0)
+    correct_count = models.IntegerField(verbose_name="Acertos", default=0)
+    compacted = models.BooleanField(verbose_name="Compactado", default=False)
+
+    class Meta:
+        verbose_name = "Atividade diária"
+        verbose_name_plural = "Atividades diárias"
+        indexes = [
+            models.Index(fields=["user", "date"]),
+            models.Index(fields=["compacted"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} {self.date}"
@@ -0,0 +1,12 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from apps.questions.models import QuestionSet
+
+from . import stats
+
+
+@receiver(pre_delete, sender=QuestionSet)
+def question_set_deleted(sender, instance: QuestionSet, **kwargs):
+    # Before the questions and the sessions are deleted with it
+    stats.question_set_deleted(instance)
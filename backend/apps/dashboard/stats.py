@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+
+from apps.questions.models import PracticeSession, Question, QuestionSet
+
+from . import activity
+from .models import UserStats
+
+FIELDS = ["questions_count", "practices_count", "practice_time", "answered_count", "correct_count"]
+
+
+def _increase(user_id: int, deltas: dict) -> None:
+    values = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if values:
+        UserStats.objects.filter(user_id=user_id).update(**values)
+
+
+def add(user_id: int, **deltas) -> bool:
+    """Increase the stats of a user, atomically. Called after the change was written,
+    ex: add(user.id, questions_count=10)
+    Returns False if the stats were built from the history instead, with the change.
+    """
+
+    _, created = UserStats.objects.get_or_create(user_id=user_id)
+    if created:
+        # First change of a user without stats
+        rebuild(user_id)
+        return False
+    _increase(user_id, deltas)
+    return True
+
+
+def get(user_id: int) -> UserStats:
+    """Stats of a user, built from the history if they don't exist yet."""
+
+    stats = UserStats.objects.filter(user_id=user_id).first()
+    return stats or rebuild(user_id)
+
+
+def practice_finished(session: PracticeSession) -> None:
+    """Add a finished session with its stored results, see PracticeSession.store_results."""
+
+    user_id = session.question_set.user_id  # pyright: ignore[reportAttributeAccessIssue]
+    added = add(
+        user_id,
+        practice_time=session.duration,
+        answered_count=session.answered_count,
+        correct_count=session.correct_count,
+    )
+    if added:
+        activity.record(user_id, [session])
+
+
+def _finished_sessions(sessions) -> list[PracticeSession]:
+    finished = sessions.filter(finished_at__isnull=False)
+    # Sessions finished before the results were stored
+    for session in finished.filter(results__isnull=True):
+        session.store_results()
+    return list(finished.only("id", "finished_at", "duration", "correct_count", "results"))
+
+
+def question_set_deleted(question_set: QuestionSet) -> None:
+    """Remove the questions and the practices of a set that is going to be deleted.
+    Users without stats are skipped, they are built later without the set.
+    """
+
+    user_id = question_set.user_id  # pyright: ignore[reportAttributeAccessIssue]
+    if not UserStats.objects.filter(user_id=user_id).exists():
+        return
+
+    sessions = PracticeSession.objects.filter(question_set=question_set)
+    finished = _finished_sessions(sessions)
+    _increase(
+        user_id,
+        {
+            "questions_count": -question_set.questions.count(),
+            "practices_count": -sessions.count(),
+            "practice_time": -sum((s.duration or timedelta() for s in finished), timedelta()),
+            "answered_count": -sum(s.answered_count for s in finished),
+            "correct_count": -sum(s.correct_count or 0 for s in finished),
+        },
+    )
+    activity.record(user_id, finished, sign=-1)
+
+
+def rebuild(user_id: int) -> UserStats:
+    """Compute again the stats and the daily activity of a user from the questions and
+    the sessions.
+    """
+
+    sessions = PracticeSession.objects.filter(question_set__user_id=user_id)
+    finished = _finished_sessions(sessions)
+    values = {
+        "questions_count": Question.objects.filter(question_set__user_id=user_id).count(),
+        "practices_count": sessions.count(),
+        "practice_time": sum((s.duration or timedelta() for s in finished), timedelta()),
+        "answered_count": sum(s.answered_count for s in finished),
+        "correct_count": sum(s.correct_count or 0 for s in finished),
+    }
+    with transaction.atomic():
+        stats, _ = UserStats.objects.select_for_update().get_or_create(user_id=user_id)
+        for field, value in values.items():
+            setattr(stats, field, value)
+        stats.save(update_fields=FIELDS)
+        activity.rebuild(user_id, finished)
+    return stats
@@ -0,0 +1,14 @@
+import logging
+
+from celery import shared_task
+
+from . import activity
+
+log = logging.getLogger(__name__)
+
+
+@shared_task(max_retries=0)
+def compact_daily_activity_task() -> None:
+    compacted = activity.compact()
+    if compacted:
+        log.info(f"Compacted the activity of {compacted} days")
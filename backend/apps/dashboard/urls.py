@@ -4,4 +4,5 @@ from . import views
 
 urlpatterns = [
     path("", views.dashboard_view, name="dashboard"),
+    path("activity", views.activity_view, name="activity"),
 ]
@@ -1,31 +1,64 @@
 from datetime import timedelta
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.http import HttpRequest
 from django.shortcuts import render
+from django.utils import timezone
 
-from apps.questions.models import PracticeSession, Question
+from . import activity, stats
+
+# Periods of the activity page, in days
+ACTIVITY_PERIODS = [30, 90, 365]
 
 
 @login_required
-def dashboard_view(request: HttpRequest):
-    questions_count = Question.objects.filter(question_set__user=request.user).count()
-    practice_sessions = PracticeSession.objects.filter(question_set__user=request.user).all()
-    practices_count = practice_sessions.count()
+async def dashboard_view(request: HttpRequest):
+    user = await request.auser()
+    user_stats = await sync_to_async(stats.get)(user.id)
 
-    practice_time = timedelta()
-    for session in practice_sessions:
-        if session.finished_at is None:
-            continue
+    # The templates and context processors use the sync ORM
+    return await sync_to_async(render)(
+        request,
+        "dashboard/dashboard.html",
+        context={"stats": user_stats},
+    )
 
-        practice_time += session.finished_at - session.created_at
 
-    return render(
+@login_required
+async def activity_view(request: HttpRequest):
+    user = await request.auser()
+    try:
+        days = int(request.GET.get("days", ACTIVITY_PERIODS[0]))
+    except ValueError:
+        days = ACTIVITY_PERIODS[0]
+    if days not in ACTIVITY_PERIODS:
+        days = ACTIVITY_PERIODS[0]
+
+    end = timezone.localdate()
+    daily = await sync_to_async(activity.get)(user.id, end - timedelta(days=days - 1), end)
+
+    answered = sum(day["answered_count"] for day in daily)
+    correct = sum(day["correct_count"] for day in daily)
+    chart = {
+        "labels": [day["date"].strftime("%d/%m") for day in daily],
+        "answered": [day["answered_count"] for day in daily],
+        "correct": [day["correct_count"] for day in daily],
+        "minutes": [round(day["practice_time"].total_seconds() / 60, 1) for day in daily],
+    }
+
+    # The templates and context processors use the sync ORM
+    return await sync_to_async(render)(
         request,
-        "dashboard/dashboard.html",
+        "dashboard/activity.html",
         context={
-            "questions_count": questions_count,
-            "practices_count": practices_count,
-            "practice_time": practice_time,
+            "title": "Atividade",
+            "days": days,
+            "periods": ACTIVITY_PERIODS,
+            "chart": chart,
+            "practices_count": sum(day["practices_count"] for day in daily),
+            "practice_time": sum((day["practice_time"] for day in daily), timedelta()),
+            "answered_count": answered,
+            "score": correct / answered * 100 if answered else 0,
         },
     )
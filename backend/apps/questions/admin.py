@@ -1,8 +1,21 @@
 from django.contrib import admin
+from django.db.models import F
 
 from apps.common.admin import BaseDBModelAdmin
 
-from .models import Choice, PracticeAnswer, PracticeSession, Question, QuestionSet
+from . import telemetry
+from .models import (
+    Choice,
+    GenerationBatch,
+    GenerationCacheEntry,
+    GenerationCacheStats,
+    GenerationJob,
+    GenerationTelemetry,
+    PracticeAnswer,
+    PracticeSession,
+    Question,
+    QuestionSet,
+)
 
 
 @admin.register(QuestionSet)
@@ -10,14 +23,96 @@ class QuestionSetAdmin(BaseDBModelAdmin):
     list_display = ["id", "title", "user", "description", "created_at", "prompt", "model", "status"]
 
 
+class AccuracyFilter(admin.SimpleListFilter):
+    """Questions by the accuracy of their answers, to find the too easy, too hard or
+    broken ones. Only questions with MIN_ANSWERS answers are classified.
+    """
+
+    title = "acertos"
+    parameter_name = "accuracy"
+
+    MIN_ANSWERS = 5
+
+    def lookups(self, request, model_admin):
+        return [
+            ("low", "Menos de 20%"),
+            ("medium", "De 20% a 80%"),
+            ("high", "Mais de 80%"),
+            ("few", f"Menos de {self.MIN_ANSWERS} respostas"),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == "few":
+            return queryset.filter(answers_count__lt=self.MIN_ANSWERS)
+
+        answered = queryset.filter(answers_count__gte=self.MIN_ANSWERS)
+        if self.value() == "low":
+            return answered.filter(correct_count__lt=F("answers_count") * 0.2)
+        if self.value() == "medium":
+            return answered.filter(
+                correct_count__gte=F("answers_count") * 0.2,
+                correct_count__lte=F("answers_count") * 0.8,
+            )
+        if self.value() == "high":
+            return answered.filter(correct_count__gt=F("answers_count") * 0.8)
+        return queryset
+
+
+class ChoiceInline(admin.TabularInline):
+    model = Choice
+    fields = ["text", "is_correct", "picks_count", "pick_rate"]
+    readonly_fields = ["picks_count", "pick_rate"]
+    extra = 0
+
+    @admin.display(description="Taxa de escolha")
+    def pick_rate(self, obj: Choice):
+        answers_count = obj.question.answers_count
+        return f"{obj.picks_count / answers_count * 100:.1f}%" if answers_count else "-"
+
+
 @admin.register(Question)
 class QuestionAdmin(BaseDBModelAdmin):
-    list_display = ["id", "question_set", "text", "type", "explanation"]
+    list_display = ["id", "question_set", "text", "type", "answers_count", "accuracy"]
+    list_filter = [AccuracyFilter]
+    # The HTML is rendered from the markdown when saving
+    exclude = ["text_html", "explanation_html"]
+    readonly_fields = ["answers_count", "correct_count"]
+    inlines = [ChoiceInline]
+
+    @admin.display(description="Acertos", ordering="correct_count")
+    def accuracy(self, obj: Question):
+        return f"{obj.accuracy:.1f}%" if obj.accuracy is not None else "-"
+
+    # Invalidate the cached question grid of the sets, the deletes don't send signals to
+    # keep the cascades fast. After the choices of the inline, so the grid isn't cached
+    # again without them.
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        QuestionSet.bump_cache_version(form.instance.question_set_id)
+
+    def delete_model(self, request, obj: Question):
+        super().delete_model(request, obj)
+        QuestionSet.bump_cache_version(obj.question_set_id)  # pyright: ignore[reportAttributeAccessIssue]
+
+    def delete_queryset(self, request, queryset):
+        question_set_ids = set(queryset.values_list("question_set_id", flat=True))
+        super().delete_queryset(request, queryset)
+        QuestionSet.bump_cache_version(*question_set_ids)
 
 
 @admin.register(Choice)
 class ChoiceAdmin(BaseDBModelAdmin):
-    list_display = ["id", "question", "text", "is_correct"]
+    list_display = ["id", "question", "text", "is_correct", "picks_count"]
+    readonly_fields = ["picks_count"]
+
+    def delete_model(self, request, obj: Choice):
+        super().delete_model(request, obj)
+        QuestionSet.bump_cache_version(obj.question.question_set_id)  # pyright: ignore[reportAttributeAccessIssue]
+
+    def delete_queryset(self, request, queryset):
+        question_set_ids = set(queryset.values_list("question__question_set_id", flat=True))
+        super().delete_queryset(request, queryset)
+        QuestionSet.bump_cache_version(*question_set_ids)
 
 
 @admin.register(PracticeSession)
@@ -28,3 +123,79 @@ class PracticeSessionAdmin(BaseDBModelAdmin):
 @admin.register(PracticeAnswer)
 class PracticeAnswerAdmin(BaseDBModelAdmin):
     list_display = ["id", "session", "question", "choice"]
+
+
+@admin.register(GenerationCacheEntry)
+class GenerationCacheEntryAdmin(BaseDBModelAdmin):
+    list_display = [
+        "id",
+        "prompt",
+        "questions_number",
+        "model",
+        "status",
+        "hits",
+        "last_used_at",
+        "expires_at",
+    ]
+    list_filter = ["status", "model"]
+    search_fields = ["prompt"]
+
+
+@admin.register(GenerationCacheStats)
+class GenerationCacheStatsAdmin(admin.ModelAdmin):
+    list_display = ["date", "hits", "misses", "hit_rate"]
+
+    @admin.display(description="Taxa de acerto")
+    def hit_rate(self, obj: GenerationCacheStats):
+        return f"{obj.hit_rate:.1f}%"
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(BaseDBModelAdmin):
+    list_display = [
+        "id",
+        "user",
+        "question_set",
+        "questions_number",
+        "status",
+        "queued_at",
+        "started_at",
+        "finished_at",
+    ]
+    list_filter = ["status"]
+
+
+@admin.register(GenerationTelemetry)
+class GenerationTelemetryAdmin(BaseDBModelAdmin):
+    list_display = [
+        "id",
+        "question_set",
+        "model",
+        "status",
+        "cached",
+        "questions_count",
+        "prompt_tokens",
+        "completion_tokens",
+        "queue_wait",
+        "llm_latency",
+        "parse_time",
+        "db_write_time",
+        "cost",
+        "finished_at",
+    ]
+    list_filter = ["model", "status", "cached"]
+    date_hierarchy = "finished_at"
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        # Summarize the generations of the current filters
+        if hasattr(response, "context_data") and "cl" in response.context_data:
+            response.context_data["summary"] = telemetry.summarize(
+                response.context_data["cl"].queryset
+            )
+        return response
+
+
+@admin.register(GenerationBatch)
+class GenerationBatchAdmin(BaseDBModelAdmin):
+    list_display = ["id", "name", "user", "total", "created_at"]
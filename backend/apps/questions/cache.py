@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections.abc import Callable
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GenerationCacheEntry, GenerationCacheStats
+from .service import GenerateQuestionSetResponse, _shuffle_choices, router
+
+log = logging.getLogger(__name__)
+
+# Seconds between checks while waiting for an identical generation in flight
+POLL_INTERVAL = 1
+
+
+def make_key(prompt: str, questions_number: int) -> str:
+    """Build the cache key from the normalized prompt, the number of questions and the models
+    of the backends the generations are routed to. Case, accents, punctuation and extra
+    spaces are ignored.
+    """
+
+    normalized = unicodedata.normalize("NFKD", prompt.casefold())
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", normalized).split())
+
+    # Any of the backends may serve the generation, changing them invalidates the cache
+    models = ",".join(sorted({backend.model for backend in router.backends}))
+    raw = f"{models}:{questions_number}:{normalized}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _record_stats(hits: int = 0, misses: int = 0) -> None:
+    stats, _ = GenerationCacheStats.objects.get_or_create(date=timezone.localdate())
+    GenerationCacheStats.objects.filter(id=stats.id).update(
+        hits=F("hits") + hits, misses=F("misses") + misses
+    )
+
+
+def _evict() -> None:
+    """Remove the expired entries and the least recently used ones over the limit."""
+
+    GenerationCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    ids = list(
+        GenerationCacheEntry.objects.order_by("-last_used_at").values_list("id", flat=True)[
+            settings.GENERATION_CACHE_MAX_ENTRIES : settings.GENERATION_CACHE_MAX_ENTRIES + 1000
+        ]
+    )
+    if ids:
+        GenerationCacheEntry.objects.filter(id__in=ids).delete()
+
+
+def _attempt(
+    key: str, prompt: str, questions_number: int
+) -> tuple[GenerateQuestionSetResponse | None, str | None] | None:
+    """One check of `acquire`. Returns None while an identical generation is in flight."""
+
+    lock_timeout = timedelta(seconds=settings.GENERATION_CACHE_WAIT_TIMEOUT)
+    while True:
+        now = timezone.now()
+        entry, created = GenerationCacheEntry.objects.get_or_create(
+            key=key,
+            defaults={
+                "prompt": prompt,
+                "questions_number": questions_number,
+                # Set by `store`, with the model that served the generation
+                "model": "",
+                "status": "pending",
+                "last_used_at": now,
+                "expires_at": now + lock_timeout,
+            },
+        )
+        if created:
+            _record_stats(misses=1)
+            return None, entry.id
+
+        # Expired entry or abandoned generation
+        if entry.expires_at <= now:
+            GenerationCacheEntry.objects.filter(id=entry.id, expires_at__lte=now).delete()
+            continue
+
+        if entry.status == "success":
+            GenerationCacheEntry.objects.filter(id=entry.id).update(
+                hits=F("hits") + 1, last_used_at=now
+            )
+            _record_stats(hits=1)
+
+            response = GenerateQuestionSetResponse(**entry.response)
+            _shuffle_choices(response.questions)
+            return response, None
+
+        return None
+
+
+def _timeout(key: str) -> tuple[None, None]:
+    log.warning(f"Timeout waiting for the generation in flight of cache key {key}")
+    _record_stats(misses=1)
+    return None, None
+
+
+def acquire(
+    prompt: str, questions_number: int
+) -> tuple[GenerateQuestionSetResponse | None, str | None]:
+    """Get the cached response for a generation request.
+
+    On a miss, returns the id of the entry that locks the request while it is generated.
+    It must be passed to `store` or `release` at the end. Identical requests made meanwhile
+    wait for it instead of starting their own generation.
+    """
+
+    key = make_key(prompt, questions_number)
+    deadline = time.monotonic() + settings.GENERATION_CACHE_WAIT_TIMEOUT
+
+    while (result := _attempt(key, prompt, questions_number)) is None:
+        if time.monotonic() >= deadline:
+            return _timeout(key)
+        time.sleep(POLL_INTERVAL)
+    return result
+
+
+def _in_thread(func: Callable) -> Callable:
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+async def aacquire(
+    prompt: str, questions_number: int
+) -> tuple[GenerateQuestionSetResponse | None, str | None]:
+    """Async version of `acquire`. Only the checks run in worker threads, the wait between
+    them doesn't hold one.
+    """
+
+    key = make_key(prompt, questions_number)
+    deadline = time.monotonic() + settings.GENERATION_CACHE_WAIT_TIMEOUT
+
+    while (result := await _in_thread(_attempt)(key, prompt, questions_number)) is None:
+        if time.monotonic() >= deadline:
+            return await _in_thread(_timeout)(key)
+        await asyncio.sleep(POLL_INTERVAL)
+    return result
+
+
+def store(entry_id: str, response: GenerateQuestionSetResponse, model: str) -> None:
+    now = timezone.now()
+    GenerationCacheEntry.objects.filter(id=entry_id).update(
+        status="success",
+        model=model,
+        response=response.model_dump(),
+        last_used_at=now,
+        expires_at=now + timedelta(seconds=settings.GENERATION_CACHE_TTL),
+    )
+    _evict()
+
+
+def release(entry_id: str) -> None:
+    """Release the lock of a failed generation, so a waiting request can take it."""
+
+    GenerationCacheEntry.objects.filter(id=entry_id, status="pending").delete()
+
+
+def finish(
+    entry_id: str | None, response: GenerateQuestionSetResponse | None, model: str = ""
+) -> None:
+    """Store a complete response, served by `model`, in the cache or release the lock of
+    the generation.
+    """
+
+    if entry_id is None:
+        return
+    if response is None:
+        release(entry_id)
+    else:
+        store(entry_id, response, model)
@@ -2,6 +2,10 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+from django.utils.functional import SimpleLazyObject
+
+from . import sidebar
+
 if TYPE_CHECKING:
     from django.http import HttpRequest
 
@@ -9,6 +13,8 @@ if TYPE_CHECKING:
 def user_question_sets(request: HttpRequest):
     if request.user.is_authenticated:
         return {
-            "user_question_sets": request.user.question_sets.order_by("-pinned_at", "-id").all()  # pyright: ignore
+            # Only queried when the cached sidebar is missing
+            "user_question_sets": SimpleLazyObject(lambda: sidebar.get_page(request.user.id)),  # pyright: ignore
+            "sidebar_cache_ttl": sidebar.CACHE_TTL,
         }
-    return {"user_question_sets": []}
+    return {"user_question_sets": None}
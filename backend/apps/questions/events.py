@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import weakref
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+
+from apps.common.redis import get_async_redis, get_redis
+
+from . import scheduler
+from .models import Question, QuestionSet
+
+log = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "questions:events:"
+# Seconds without events before checking the database, in case an event was missed
+KEEPALIVE = 15
+# Seconds a stream stays open, the browser reconnects after it
+STREAM_TIMEOUT = 5 * 60
+# Milliseconds the browser waits before reconnecting
+RETRY = 3000
+
+
+def _channel(question_set_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{question_set_id}"
+
+
+def publish(question_set_id: str, status: str, questions_count: int) -> None:
+    """Notify the open pages of a set about its status and generated questions.
+    Never raises, the pages also check the database from time to time.
+    """
+
+    data = json.dumps({"status": status, "questions_count": questions_count})
+    try:
+        get_redis().publish(_channel(question_set_id), data)
+    except Exception as e:
+        log.warning(f"Error publishing event of question set {question_set_id}: {e}")
+
+
+async def apublish(question_set_id: str, status: str, questions_count: int) -> None:
+    """Async version of `publish`."""
+
+    data = json.dumps({"status": status, "questions_count": questions_count})
+    try:
+        await get_async_redis().publish(_channel(question_set_id), data)
+    except Exception as e:
+        log.warning(f"Error publishing event of question set {question_set_id}: {e}")
+
+
+class _Subscriber:
+    """Single Redis subscription of the process, shared by all the open streams."""
+
+    def __init__(self) -> None:
+        self.queues: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self.task: asyncio.Task | None = None
+
+    async def _listen(self) -> None:
+        try:
+            pubsub = get_async_redis().pubsub()
+            await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+            async for message in pubsub.listen():
+                if message["type"] != "pmessage":
+                    continue
+                for queue in self.queues.get(message["channel"].decode(), ()):
+                    queue.put_nowait(message["data"])
+        except Exception as e:
+            # The streams keep checking the database, the next one subscribes again
+            log.warning(f"Lost the subscription to the question set events: {e}")
+
+    @asynccontextmanager
+    async def subscribe(self, question_set_id: str) -> AsyncIterator[asyncio.Queue]:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._listen())
+
+        channel = _channel(question_set_id)
+        queue = asyncio.Queue()
+        self.queues[channel].add(queue)
+        try:
+            yield queue
+        finally:
+            self.queues[channel].discard(queue)
+            if not self.queues[channel]:
+                del self.queues[channel]
+
+
+_subscribers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Subscriber] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_subscriber() -> _Subscriber:
+    loop = asyncio.get_running_loop()
+    if loop not in _subscribers:
+        _subscribers[loop] = _Subscriber()
+    return _subscribers[loop]
+
+
+async def _snapshot(question_set_id: str) -> dict | None:
+    question_set = await QuestionSet.objects.filter(id=question_set_id).values("status").afirst()
+    if question_set is None:
+        return None
+
+    return {
+        "status": question_set["status"],
+        "questions_count": await Question.objects.filter(question_set_id=question_set_id).acount(),
+        "queue_position": await sync_to_async(scheduler.queue_position)(question_set_id),
+    }
+
+
+def _format(data: dict) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+
+async def stream(question_set_id: str) -> AsyncIterator[str]:
+    """Server-Sent Events of a set, until it finishes or STREAM_TIMEOUT.
+
+    Idle streams only hold a queue, so one process can keep many of them open.
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_TIMEOUT
+    yield f"retry: {RETRY}\n\n"
+
+    # Subscribe before reading the current state to not miss any change
+    async with _get_subscriber().subscribe(question_set_id) as queue:
+        event = await _snapshot(question_set_id)
+        while event is not None:
+            yield _format(event)
+            if event["status"] != "pending" or loop.time() > deadline:
+                break
+
+            try:
+                event = json.loads(await asyncio.wait_for(queue.get(), timeout=KEEPALIVE))
+            except TimeoutError:
+                event = await _snapshot(question_set_id)
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+from collections.abc import Callable
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from apps.common.db import WriteQueryTimer
+from apps.common.redis import get_async_redis, get_redis
+
+from . import cache as generation_cache
+from . import events, telemetry
+from .models import QuestionSet
+from .persistence import save_questions, save_response
+from .service import (
+    GenerateQuestionSetResponse,
+    GenerationStats,
+    agenerate_questions,
+    astream_questions,
+    merge_responses,
+    split_shards,
+)
+
+log = logging.getLogger(__name__)
+
+QUEUE_KEY = "questions:generation:jobs"
+
+
+def submit(question_set_id: str, prompt: str, questions_number: int) -> None:
+    """Queue a generation for the async executor."""
+
+    job = {
+        "question_set_id": str(question_set_id),
+        "prompt": prompt,
+        "questions_number": questions_number,
+    }
+    get_redis().rpush(QUEUE_KEY, json.dumps(job))
+
+
+def _db_step(func: Callable, timer: WriteQueryTimer | None = None) -> Callable:
+    """Run a blocking database step in a worker thread, out of the event loop.
+    The write queries are timed by `timer`, if given.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            if timer is None:
+                return func(*args, **kwargs)
+            with connection.execute_wrapper(timer):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+async def _generate_streaming(
+    question_set: QuestionSet,
+    prompt: str,
+    questions_number: int,
+    stats: GenerationStats,
+    timer: WriteQueryTimer,
+) -> GenerateQuestionSetResponse | None:
+    """Async version of `tasks._generate_streaming`."""
+
+    questions = []
+    try:
+        async for key, value in astream_questions(prompt, questions_number, stats):
+            if question_set.model != stats.model:
+                question_set.model = stats.model
+                await _db_step(question_set.save, timer)(update_fields=["model"])
+            if key == "question":
+                await _db_step(save_questions, timer)(question_set, [value])
+                questions.append(value)
+                await events.apublish(question_set.id, "pending", len(questions))
+            else:
+                setattr(question_set, key, value)
+                await _db_step(question_set.save, timer)(update_fields=[key])
+    except Exception as e:
+        if not questions:
+            raise
+        log.exception(
+            f"Stream broke for question set {question_set.id} after {len(questions)} questions: {e}"
+        )
+        return None
+
+    if not questions:
+        raise ValueError("The stream finished without any valid question")
+
+    return GenerateQuestionSetResponse(
+        title=question_set.title,
+        description=question_set.description or "",
+        questions=questions,
+    )
+
+
+async def _generate_sharded(
+    question_set: QuestionSet,
+    prompt: str,
+    questions_number: int,
+    stats: GenerationStats,
+    timer: WriteQueryTimer,
+) -> GenerateQuestionSetResponse | None:
+    """Generate the shards concurrently in the event loop, instead of a Celery chord.
+    Returns the merged response if all shards succeeded, or None if some failed.
+    """
+
+    shards = split_shards(questions_number, settings.AI_SERVICE_SHARD_SIZE)
+    shards_stats = [GenerationStats() for _ in shards]
+    results = await asyncio.gather(
+        *(
+            agenerate_questions(prompt, count, (index, len(shards)), shards_stats[index])
+            for index, count in enumerate(shards)
+        ),
+        return_exceptions=True,
+    )
+    stats.merge(shards_stats)
+
+    responses = []
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            log.error(f"Error generating questions shard {index + 1}/{len(shards)}: {result}")
+        else:
+            responses.append(result)
+    if not responses:
+        raise ValueError("All the shards failed")
+
+    response = merge_responses(responses)
+    await _db_step(save_response, timer)(question_set, response, stats.model)
+    return response if len(responses) == len(results) else None
+
+
+async def generate_question_set(question_set_id: str, prompt: str, questions_number: int) -> None:
+    """Async version of `tasks.generate_questions_task`, with the same statuses."""
+
+    log.info(f"Async generation started for question set {question_set_id}")
+
+    question_set = await _db_step(QuestionSet.objects.get)(id=question_set_id)
+    queue_wait = await _db_step(telemetry.queue_wait)(question_set_id)
+    stats = GenerationStats()
+    timer = WriteQueryTimer()
+    cached = None
+    cache_entry_id = None
+
+    try:
+        if settings.GENERATION_CACHE_ENABLED:
+            cached, cache_entry_id = await generation_cache.aacquire(prompt, questions_number)
+
+        if cached is not None:
+            log.info(f"Generation cache hit for question set {question_set_id}")
+            stats.cached = True
+            await _db_step(save_response, timer)(question_set, cached)
+        elif questions_number > settings.AI_SERVICE_SHARD_SIZE:
+            response = await _generate_sharded(question_set, prompt, questions_number, stats, timer)
+            await _db_step(generation_cache.finish)(cache_entry_id, response, stats.model)
+        elif settings.AI_SERVICE_STREAM:
+            response = await _generate_streaming(
+                question_set, prompt, questions_number, stats, timer
+            )
+            await _db_step(generation_cache.finish)(cache_entry_id, response, stats.model)
+        else:
+            response = await agenerate_questions(prompt, questions_number, stats=stats)
+            await _db_step(save_response, timer)(question_set, response, stats.model)
+            await _db_step(generation_cache.finish)(cache_entry_id, response, stats.model)
+        question_set.status = "success"
+    except Exception as e:
+        log.exception(f"Error generating questions for {question_set_id}: {e}")
+        await _db_step(generation_cache.finish)(cache_entry_id, None)
+        question_set.status = "error"
+
+    await _db_step(question_set.save, timer)(update_fields=["status"])
+    await _db_step(telemetry.record)(
+        question_set_id, questions_number, stats, queue_wait, timer.elapsed
+    )
+
+
+class AsyncGenerationExecutor:
+    """Run many generations concurrently in a single process.
+
+    Jobs are taken from the Redis queue only while there is a free slot, so the
+    remaining jobs stay available to the other executor processes.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _run_job(self, semaphore: asyncio.Semaphore, job: dict) -> None:
+        try:
+            await generate_question_set(
+                job["question_set_id"], job["prompt"], job["questions_number"]
+            )
+        except Exception as e:
+            log.exception(f"Error running generation job {job}: {e}")
+        finally:
+            semaphore.release()
+
+    async def run(self) -> None:
+        redis = get_async_redis()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running: set[asyncio.Task] = set()
+
+        try:
+            while not self._stopping.is_set():
+                await semaphore.acquire()
+                item = await redis.blpop([QUEUE_KEY], timeout=1)
+                if item is None:
+                    semaphore.release()
+                    continue
+
+                job = json.loads(item[1])
+                task = asyncio.create_task(self._run_job(semaphore, job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        finally:
+            # Let the generations in flight finish
+            if running:
+                log.info(f"Waiting {len(running)} generations in flight")
+                await asyncio.gather(*running, return_exceptions=True)
@@ -1,6 +1,65 @@
+import csv
+import io
+import json
+
 from django import forms
+from django.conf import settings
+
+# Max size of the batch file, in characters
+MAX_BATCH_FILE_SIZE = 1024 * 1024
 
 
 class QuestionSetAddForm(forms.Form):
     prompt = forms.CharField(min_length=10, max_length=2048, strip=True)
-    questions_number = forms.IntegerField(min_value=2, max_value=10, initial=5)
+    questions_number = forms.IntegerField(min_value=2, max_value=100, initial=5)
+
+
+class GenerationBatchForm(forms.Form):
+    """Upload of a CSV (columns `prompt` and `questions_number`) or JSON list
+    (`[{"prompt": ..., "questions_number": ...}]`) of question sets to generate.
+    """
+
+    file = forms.FileField()
+
+    def _read_rows(self, file) -> list[dict]:
+        text = file.read(MAX_BATCH_FILE_SIZE + 1).decode("utf-8-sig")
+        if len(text) > MAX_BATCH_FILE_SIZE:
+            raise forms.ValidationError("O arquivo é muito grande.")
+
+        if file.name.lower().endswith(".json") or text.lstrip().startswith("["):
+            rows = json.loads(text)
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise ValueError("Expected a list of objects")
+            return rows
+        return list(csv.DictReader(io.StringIO(text)))
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        try:
+            rows = self._read_rows(file)
+        except (ValueError, UnicodeDecodeError, csv.Error):
+            raise forms.ValidationError("Não foi possível ler o arquivo, use um CSV ou JSON.")
+
+        if not rows:
+            raise forms.ValidationError("O arquivo não tem nenhum prompt.")
+        if len(rows) > settings.GENERATION_BATCH_MAX_SIZE:
+            raise forms.ValidationError(
+                f"O lote pode ter no máximo {settings.GENERATION_BATCH_MAX_SIZE} prompts."
+            )
+
+        # Each row is validated as a single question set
+        self.items = []
+        for line, row in enumerate(rows, start=1):
+            row_form = QuestionSetAddForm(
+                {
+                    "prompt": row.get("prompt") or "",
+                    "questions_number": row.get("questions_number")
+                    or QuestionSetAddForm.base_fields["questions_number"].initial,
+                }
+            )
+            if not row_form.is_valid():
+                errors = "; ".join(e for field in row_form.errors.values() for e in field)
+                raise forms.ValidationError(f"Item {line} inválido: {errors}")
+            self.items.append(row_form.cleaned_data)
+
+        return file
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.common.markdown import render_markdown
+from apps.questions.models import Question
+
+
+class Command(BaseCommand):
+    help = "Render and store the HTML of the questions saved before it was stored."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all", action="store_true", help="Render again the questions that have HTML."
+        )
+
+    def handle(self, *args, **options):
+        questions = Question.objects.order_by("id").only("id", "text", "explanation")
+        if not options["all"]:
+            questions = questions.filter(Q(text_html="") | Q(explanation_html=""))
+
+        # Walk by id, so the rows updated don't shift the chunks
+        last_id = ""
+        total = 0
+        while True:
+            chunk = list(questions.filter(id__gt=last_id)[: options["batch_size"]])
+            if not chunk:
+                break
+
+            for question in chunk:
+                question.text_html = render_markdown(question.text)
+                question.explanation_html = render_markdown(question.explanation)
+            Question.objects.bulk_update(chunk, ["text_html", "explanation_html"])
+
+            last_id = chunk[-1].id
+            total += len(chunk)
+            self.stdout.write(f"{total} questions rendered")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} questions rendered"))
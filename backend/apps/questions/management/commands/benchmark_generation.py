@@ -0,0 +1,110 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from ulid import ULID
+
+from apps.accounts.models import User
+from apps.questions.models import GenerationTelemetry, QuestionSet
+from apps.questions.tasks import dispatch_generation
+from apps.questions.telemetry import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate question sets through the Celery workers and report the throughput. "
+        "Use it with the fake_ai_server command to avoid spending LLM quota."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sets", type=int, default=20, help="Number of question sets.")
+        parser.add_argument("--questions", type=int, default=5, help="Questions per set.")
+        parser.add_argument(
+            "--same-prompt",
+            action="store_true",
+            help="Use the same prompt for all the sets (exercises the generation cache).",
+        )
+        parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated sets.")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(
+            email="benchmark@example.com",
+            defaults={"first_name": "Benchmark", "last_name": "Benchmark", "is_active": False},
+        )
+        run_id = ULID()
+
+        question_sets = []
+        for i in range(options["sets"]):
+            prompt = f"Questões de benchmark {run_id}"
+            if not options["same_prompt"]:
+                prompt += f" ({i})"
+            question_sets.append(
+                QuestionSet.objects.create(
+                    user=user, title=prompt[:128], prompt=prompt, status="pending"
+                )
+            )
+
+        start = time.perf_counter()
+        started = {}
+        for question_set in question_sets:
+            started[question_set.id] = time.perf_counter()
+            dispatch_generation(question_set.id, question_set.prompt, options["questions"])
+
+        # Poll until every set leaves the pending status
+        latencies = {}
+        statuses = {}
+        deadline = start + options["timeout"]
+        while len(latencies) < len(question_sets) and time.perf_counter() < deadline:
+            finished = QuestionSet.objects.filter(id__in=started.keys()).exclude(status="pending")
+            for question_set_id, status in finished.values_list("id", "status"):
+                if question_set_id not in latencies:
+                    latencies[question_set_id] = time.perf_counter() - started[question_set_id]
+                    statuses[question_set_id] = status
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - start
+
+        # The telemetry is saved right after the status
+        time.sleep(1)
+        telemetry = list(GenerationTelemetry.objects.filter(question_set_id__in=started.keys()))
+        values = sorted(latencies.values())
+        succeeded = sum(status == "success" for status in statuses.values())
+
+        self.stdout.write(f"Sets: {len(question_sets)} x {options['questions']} questions")
+        self.stdout.write(
+            f"Finished: {len(latencies)} ({succeeded} success, {len(latencies) - succeeded} "
+            f"error, {len(question_sets) - len(latencies)} timed out)"
+        )
+        self.stdout.write(f"Elapsed: {elapsed:.1f} s")
+        self.stdout.write(f"Throughput: {len(latencies) / elapsed * 60:.1f} sets/minute")
+        self.stdout.write(
+            f"Latency: p50 {percentile(values, 50):.2f} s, p95 {percentile(values, 95):.2f} s"
+        )
+        if telemetry:
+            self._write_telemetry(telemetry)
+
+        if not options["keep"]:
+            GenerationTelemetry.objects.filter(question_set_id__in=started.keys()).delete()
+            QuestionSet.objects.filter(id__in=started.keys()).delete()
+
+    def _write_telemetry(self, telemetry: list[GenerationTelemetry]) -> None:
+        for field, label in [
+            ("queue_wait", "Queue wait"),
+            ("llm_latency", "LLM latency"),
+            ("parse_time", "Parse time"),
+            ("db_write_time", "DB write time"),
+        ]:
+            values = sorted(getattr(t, field) for t in telemetry if getattr(t, field) is not None)
+            if values:
+                self.stdout.write(
+                    f"{label}: mean {statistics.mean(values) * 1000:.1f} ms, "
+                    f"p50 {percentile(values, 50) * 1000:.1f} ms, "
+                    f"p95 {percentile(values, 95) * 1000:.1f} ms"
+                )
+
+        tokens = sum(t.total_tokens for t in telemetry)
+        questions = sum(t.questions_count for t in telemetry)
+        self.stdout.write(
+            f"Tokens: {tokens} ({tokens / questions if questions else 0:.1f} per question), "
+            f"cost {sum(t.cost for t in telemetry):.4f} USD"
+        )
@@ -0,0 +1,131 @@
+import time
+from collections.abc import Callable
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from ulid import ULID
+
+from apps.accounts.models import User
+from apps.questions import service
+from apps.questions.models import Choice, Question, QuestionSet
+from apps.questions.persistence import _sequential_ulids
+
+
+def _fake_questions(count: int) -> list[service.Question]:
+    return [
+        service.Question(
+            text=f"Questão de benchmark {i}",
+            choices=[
+                service.Choice(text=f"Alternativa {j}", is_correct=j == 0)
+                for j in range(service.QUESTION_CHOICES)
+            ],
+            explanation="Explicação da questão de benchmark.",
+        )
+        for i in range(count)
+    ]
+
+
+def _build_rows(
+    question_set: QuestionSet, questions: list[service.Question]
+) -> tuple[list[Question], list[Choice]]:
+    question_ids = _sequential_ulids(len(questions))
+    choice_ids = iter(_sequential_ulids(sum(len(q.choices) for q in questions)))
+
+    _questions = []
+    choices = []
+    for question_id, question in zip(question_ids, questions):
+        _question = Question(
+            id=question_id,
+            question_set=question_set,
+            text=question.text,
+            type="multiple_choice",
+            explanation=question.explanation,
+        )
+        _questions.append(_question)
+        choices.extend(
+            Choice(
+                id=next(choice_ids),
+                question=_question,
+                text=choice.text,
+                is_correct=choice.is_correct,
+            )
+            for choice in question.choices
+        )
+    return _questions, choices
+
+
+# Only the inserts are compared. The markdown rendering and the stats of `save_questions`,
+# and the signals of `Model.save`, are the same work whichever way the rows are inserted.
+
+
+def _save_questions_row_by_row(
+    question_set: QuestionSet, questions: list[service.Question]
+) -> None:
+    """The previous persistence path, one query for each row."""
+
+    _questions, choices = _build_rows(question_set, questions)
+    with transaction.atomic():
+        for obj in [*_questions, *choices]:
+            type(obj).objects.bulk_create([obj])
+
+
+def _save_questions_in_bulk(question_set: QuestionSet, questions: list[service.Question]) -> None:
+    """The inserts of `save_questions`, one query for each table."""
+
+    _questions, choices = _build_rows(question_set, questions)
+    with transaction.atomic():
+        Question.objects.bulk_create(_questions)
+        Choice.objects.bulk_create(choices)
+
+
+class Command(BaseCommand):
+    help = "Compare the time to insert generated question sets row by row and in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _measure(
+        self, save: Callable, questions: list[service.Question], repeat: int
+    ) -> tuple[float, int]:
+        """Run the insert inside a rolled back transaction.
+        Returns the best time in seconds and the number of queries.
+        """
+
+        best = float("inf")
+        queries = 0
+        for _ in range(repeat):
+            with transaction.atomic():
+                user = User.objects.create(email=f"benchmark-{ULID()}@example.com")
+                question_set = QuestionSet.objects.create(
+                    user=user, title="Benchmark", prompt="Benchmark", status="pending"
+                )
+
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    save(question_set, questions)
+                    best = min(best, time.perf_counter() - start)
+                queries = len(ctx.captured_queries)
+
+                transaction.set_rollback(True)
+
+        return best, queries
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'Questions':>10} {'Row by row':>14} {'Queries':>8} {'Bulk':>12} {'Queries':>8} "
+            f"{'Speedup':>8}"
+        )
+        for size in options["sizes"]:
+            questions = _fake_questions(size)
+            row_time, row_queries = self._measure(
+                _save_questions_row_by_row, questions, options["repeat"]
+            )
+            bulk_time, bulk_queries = self._measure(
+                _save_questions_in_bulk, questions, options["repeat"]
+            )
+            self.stdout.write(
+                f"{size:>10} {row_time * 1000:>11.1f} ms {row_queries:>8} "
+                f"{bulk_time * 1000:>9.1f} ms {bulk_queries:>8} {row_time / bulk_time:>7.1f}x"
+            )
@@ -0,0 +1,217 @@
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from ulid import ULID
+
+# Approximated number of characters per token
+CHARS_PER_TOKEN = 4
+# Characters sent in each streamed chunk
+CHUNK_SIZE = 4 * CHARS_PER_TOKEN
+
+
+def _fake_reply(count: int) -> str:
+    questions = []
+    for i in range(count):
+        correct = random.randrange(4)
+        questions.append(
+            {
+                "text": f"Questão {i + 1}: qual é o resultado de {i} + {correct}?",
+                "choices": [{"text": str(i + j), "is_correct": j == correct} for j in range(4)],
+                "explanation": f"A soma de {i} com {correct} é {i + correct}.",
+            }
+        )
+
+    return json.dumps(
+        {
+            "title": "Conjunto de teste",
+            "description": "Questões geradas pelo servidor de teste",
+            "questions": questions,
+        },
+        ensure_ascii=False,
+    )
+
+
+class FakeAIHandler(BaseHTTPRequestHandler):
+    server: "FakeAIServer"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, data: dict) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_event(self, data: dict | str) -> None:
+        payload = data if isinstance(data, str) else json.dumps(data)
+        self.wfile.write(f"data: {payload}\n\n".encode())
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        options = self.server.options
+
+        time.sleep(options["latency"])
+
+        if random.random() < options["error_rate"]:
+            self._send_json(
+                options["error_status"],
+                {"error": {"message": "Injected error", "type": "server_error"}},
+            )
+            return
+
+        # The number of questions is in the system prompt
+        system_prompt = next(
+            (m["content"] for m in request.get("messages", []) if m["role"] == "system"), ""
+        )
+        match = re.search(r"create (\d+) questions", system_prompt)
+        reply = _fake_reply(int(match.group(1)) if match else 5)
+
+        finish_reason = "stop"
+        if random.random() < options["truncate_rate"]:
+            reply = reply[: random.randrange(1, len(reply))]
+            finish_reason = "length"
+
+        prompt_tokens = sum(len(m["content"]) for m in request.get("messages", []))
+        prompt_tokens //= CHARS_PER_TOKEN
+        completion_tokens = len(reply) // CHARS_PER_TOKEN
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        base = {
+            "id": f"chatcmpl-{ULID()}",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+        }
+        tokens_per_second = options["tokens_per_second"]
+
+        if not request.get("stream"):
+            if tokens_per_second:
+                time.sleep(completion_tokens / tokens_per_second)
+            self._send_json(
+                200,
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": finish_reason,
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        for i in range(0, len(reply), CHUNK_SIZE):
+            if tokens_per_second:
+                time.sleep(CHUNK_SIZE / CHARS_PER_TOKEN / tokens_per_second)
+            last = i + CHUNK_SIZE >= len(reply)
+            self._send_event(
+                {
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": reply[i : i + CHUNK_SIZE]},
+                            "finish_reason": finish_reason if last else None,
+                        }
+                    ],
+                }
+            )
+
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event(
+                {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+            )
+        self._send_event("[DONE]")
+
+
+class FakeAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options: dict, verbose: bool):
+        super().__init__(address, FakeAIHandler)
+        self.options = options
+        self.verbose = verbose
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local OpenAI compatible server that generates fake questions. "
+        "Set AI_SERVICE_BASE_URL=http://<host>:<port>/v1 to use it in load tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument(
+            "--latency", type=float, default=1.0, help="Seconds before the first token."
+        )
+        parser.add_argument(
+            "--tokens-per-second",
+            type=float,
+            default=50,
+            help="Completion token rate, 0 sends the reply at once.",
+        )
+        parser.add_argument(
+            "--error-rate", type=float, default=0, help="Fraction of requests that fail."
+        )
+        parser.add_argument(
+            "--error-status", type=int, default=500, help="Status code of the failed requests."
+        )
+        parser.add_argument(
+            "--truncate-rate",
+            type=float,
+            default=0,
+            help="Fraction of replies cut at a random point, leaving invalid JSON.",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--verbose", action="store_true", help="Log every request.")
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+
+        server = FakeAIServer(
+            (options["host"], options["port"]),
+            {
+                "latency": options["latency"],
+                "tokens_per_second": options["tokens_per_second"],
+                "error_rate": options["error_rate"],
+                "error_status": options["error_status"],
+                "truncate_rate": options["truncate_rate"],
+            },
+            options["verbose"],
+        )
+        self.stdout.write(
+            f"Fake AI server listening on http://{options['host']}:{options['port']}/v1"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.questions.scheduler import queue_stats
+
+
+class Command(BaseCommand):
+    help = "Print the depth of the generation queue as JSON, for monitoring and autoscaling."
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(queue_stats()))
@@ -0,0 +1,56 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.questions.models import Choice, PracticeSession, Question
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute again the answer counters of the questions and the choices from the results "
+        "of the finished practices."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        answers = Counter()
+        correct = Counter()
+        picks = Counter()
+
+        sessions = PracticeSession.objects.filter(finished_at__isnull=False).only(
+            "id", "questions_order", "finished_at", "results"
+        )
+        total = 0
+        for session in sessions.iterator(chunk_size=options["batch_size"]):
+            if session.results is None:
+                # Finished before the results were stored
+                session.store_results()
+            for result in session.results:
+                if result["choice_id"] is None:
+                    continue
+                answers[result["question_id"]] += 1
+                correct[result["question_id"]] += result["is_correct"]
+                picks[result["choice_id"]] += 1
+            total += 1
+
+        with transaction.atomic():
+            Question.objects.update(answers_count=0, correct_count=0)
+            Choice.objects.update(picks_count=0)
+            Question.objects.bulk_update(
+                [
+                    Question(id=id, answers_count=count, correct_count=correct[id])
+                    for id, count in answers.items()
+                ],
+                ["answers_count", "correct_count"],
+                batch_size=options["batch_size"],
+            )
+            Choice.objects.bulk_update(
+                [Choice(id=id, picks_count=count) for id, count in picks.items()],
+                ["picks_count"],
+                batch_size=options["batch_size"],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} practices counted"))
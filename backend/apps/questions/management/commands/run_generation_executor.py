@@ -0,0 +1,35 @@
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.questions.executor import AsyncGenerationExecutor
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the async generation executor, used when AI_SERVICE_EXECUTOR=async. "
+        "A single process keeps many generations in flight."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.AI_SERVICE_EXECUTOR_CONCURRENCY,
+            help="Max generations in flight.",
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(options["concurrency"]))
+
+    async def _run(self, concurrency: int) -> None:
+        executor = AsyncGenerationExecutor(concurrency)
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, executor.stop)
+
+        self.stdout.write(f"Async generation executor started (concurrency {concurrency})")
+        await executor.run()
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:11
+
+import django_ulidfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0002_questionset_pinned_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationCacheEntry',
+            fields=[
+                ('id', django_ulidfield.fields.ULIDField(default=django_ulidfield.fields.generate_ulid, editable=False, max_length=26, primary_key=True, serialize=False, unique=True, validators=[django_ulidfield.fields.validate_ulid])),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Chave')),
+                ('prompt', models.TextField(verbose_name='Prompt')),
+                ('questions_number', models.SmallIntegerField(verbose_name='Número de questões')),
+                ('model', models.CharField(max_length=100, verbose_name='Nome do modelo')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('success', 'Sucesso')], max_length=20, verbose_name='Status')),
+                ('response', models.JSONField(null=True, verbose_name='Resposta')),
+                ('hits', models.IntegerField(default=0, verbose_name='Acertos')),
+                ('last_used_at', models.DateTimeField(db_index=True, verbose_name='Último uso')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Expira em')),
+            ],
+            options={
+                'verbose_name': 'Cache de geração',
+                'verbose_name_plural': 'Cache de gerações',
+                'ordering': ['-last_used_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GenerationCacheStats',
+            fields=[
+                ('id', django_ulidfield.fields.ULIDField(default=django_ulidfield.fields.generate_ulid, editable=False, max_length=26, primary_key=True, serialize=False, unique=True, validators=[django_ulidfield.fields.validate_ulid])),
+                ('date', models.DateField(unique=True, verbose_name='Data')),
+                ('hits', models.IntegerField(default=0, verbose_name='Acertos')),
+                ('misses', models.IntegerField(default=0, verbose_name='Falhas')),
+            ],
+            options={
+                'verbose_name': 'Estatística do cache de geração',
+                'verbose_name_plural': 'Estatísticas do cache de geração',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:21
+
+import django.db.models.deletion
+import django_ulidfield.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0003_generationcacheentry_generationcachestats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', django_ulidfield.fields.ULIDField(default=django_ulidfield.fields.generate_ulid, editable=False, max_length=26, primary_key=True, serialize=False, unique=True, validators=[django_ulidfield.fields.validate_ulid])),
+                ('questions_number', models.SmallIntegerField(verbose_name='Número de questões')),
+                ('status', models.CharField(choices=[('queued', 'Na fila'), ('running', 'Executando'), ('done', 'Finalizado')], db_index=True, max_length=20, verbose_name='Status')),
+                ('queued_at', models.DateTimeField(db_index=True, verbose_name='Enfileirado em')),
+                ('started_at', models.DateTimeField(null=True, verbose_name='Iniciado em')),
+                ('finished_at', models.DateTimeField(null=True, verbose_name='Finalizado em')),
+                ('question_set', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generation_job', to='questions.questionset', verbose_name='Conjunto de questões')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de geração',
+                'verbose_name_plural': 'Tarefas de geração',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
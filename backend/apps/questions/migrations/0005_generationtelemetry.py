@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:24
+
+import django.db.models.deletion
+import django_ulidfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0004_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationTelemetry',
+            fields=[
+                ('id', django_ulidfield.fields.ULIDField(default=django_ulidfield.fields.generate_ulid, editable=False, max_length=26, primary_key=True, serialize=False, unique=True, validators=[django_ulidfield.fields.validate_ulid])),
+                ('model', models.CharField(max_length=100, verbose_name='Nome do modelo')),
+                ('status', models.CharField(choices=[('success', 'Sucesso'), ('error', 'Erro')], max_length=20, verbose_name='Status')),
+                ('cached', models.BooleanField(default=False, verbose_name='Do cache')),
+                ('questions_number', models.SmallIntegerField(verbose_name='Questões pedidas')),
+                ('questions_count', models.SmallIntegerField(verbose_name='Questões geradas')),
+                ('prompt_tokens', models.IntegerField(default=0, verbose_name='Tokens do prompt')),
+                ('completion_tokens', models.IntegerField(default=0, verbose_name='Tokens da resposta')),
+                ('queue_wait', models.FloatField(null=True, verbose_name='Espera na fila')),
+                ('llm_latency', models.FloatField(verbose_name='Latência do LLM')),
+                ('parse_time', models.FloatField(verbose_name='Tempo de validação')),
+                ('db_write_time', models.FloatField(verbose_name='Tempo de escrita no banco')),
+                ('cost', models.DecimalField(decimal_places=6, default=0, max_digits=12, verbose_name='Custo (USD)')),
+                ('finished_at', models.DateTimeField(db_index=True, verbose_name='Finalizado em')),
+                ('question_set', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='telemetry', to='questions.questionset', verbose_name='Conjunto de questões')),
+            ],
+            options={
+                'verbose_name': 'Telemetria de geração',
+                'verbose_name_plural': 'Telemetria de gerações',
+                'ordering': ['-finished_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0006_generationbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='explanation_html',
+            field=models.TextField(blank=True, default='', verbose_name='Explicação (HTML)'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='text_html',
+            field=models.TextField(blank=True, default='', verbose_name='Texto (HTML)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0007_question_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionset',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Versão do cache'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0008_questionset_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='practicesession',
+            name='correct_count',
+            field=models.PositiveSmallIntegerField(null=True, verbose_name='Acertos'),
+        ),
+        migrations.AddField(
+            model_name='practicesession',
+            name='duration',
+            field=models.DurationField(null=True, verbose_name='Duração'),
+        ),
+        migrations.AddField(
+            model_name='practicesession',
+            name='results',
+            field=models.JSONField(null=True, verbose_name='Resultados'),
+        ),
+        migrations.AddField(
+            model_name='practicesession',
+            name='score',
+            field=models.FloatField(null=True, verbose_name='Aproveitamento (%)'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:51
+
+from django.db import migrations, models
+
+
+def delete_duplicated_answers(apps, schema_editor):
+    # Keep the last answer of each question, the one `update_or_create` kept updating
+    PracticeAnswer = apps.get_model("questions", "PracticeAnswer")
+    duplicated = (
+        PracticeAnswer.objects.values("session_id", "question_id")
+        .annotate(count=models.Count("id"), last_id=models.Max("id"))
+        .filter(count__gt=1)
+    )
+    for answer in duplicated:
+        PracticeAnswer.objects.filter(
+            session_id=answer["session_id"], question_id=answer["question_id"]
+        ).exclude(id=answer["last_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0009_practicesession_results'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicated_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='practiceanswer',
+            constraint=models.UniqueConstraint(fields=('session', 'question'), name='unique_practice_answer_question'),
+        ),
+    ]
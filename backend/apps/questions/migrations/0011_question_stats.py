@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0010_practiceanswer_unique_question'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='picks_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Escolhas'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Respostas'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='correct_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Acertos'),
+        ),
+    ]
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone
 
 from apps.accounts.models import User
+from apps.common.markdown import render_markdown
 from apps.common.models import BaseDBModel
 
 if TYPE_CHECKING:
@@ -29,6 +31,15 @@ class QuestionSet(BaseDBModel):
         ],
     )
     pinned_at = models.DateTimeField(verbose_name="Fixado em", null=True)
+    batch = models.ForeignKey(
+        "GenerationBatch",
+        on_delete=models.SET_NULL,
+        related_name="question_sets",
+        verbose_name="Lote",
+        null=True,
+    )
+    # Part of the key of the cached question grid, increased when a question changes
+    cache_version = models.PositiveIntegerField(verbose_name="Versão do cache", default=0)
 
     if TYPE_CHECKING:
         questions: RelatedManager["Question"]
@@ -41,6 +52,18 @@ class QuestionSet(BaseDBModel):
     def __str__(self) -> str:
         return self.title
 
+    @classmethod
+    def bump_cache_version(cls, *question_set_ids: str) -> None:
+        """Invalidate the cached question grid of the sets."""
+
+        cls.objects.filter(id__in=question_set_ids).update(
+            cache_version=models.F("cache_version") + 1
+        )
+
+
+# Markdown fields of a question and the field with their HTML
+MARKDOWN_FIELDS = {"text": "text_html", "explanation": "explanation_html"}
+
 
 class Question(BaseDBModel):
     question_set = models.ForeignKey(
@@ -58,6 +81,12 @@ class Question(BaseDBModel):
         ],
     )
     explanation = models.TextField(verbose_name="Explicação")
+    # Markdown rendered when the question is saved, the pages fall back to the raw text
+    text_html = models.TextField(verbose_name="Texto (HTML)", blank=True, default="")
+    explanation_html = models.TextField(verbose_name="Explicação (HTML)", blank=True, default="")
+    # Answers of the finished practices, see PracticeSession.update_question_stats
+    answers_count = models.PositiveIntegerField(verbose_name="Respostas", default=0)
+    correct_count = models.PositiveIntegerField(verbose_name="Acertos", default=0)
 
     if TYPE_CHECKING:
         choices: RelatedManager["Choice"]
@@ -69,6 +98,47 @@ class Question(BaseDBModel):
     def __str__(self) -> str:
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Sources of the stored HTML, to render it again only when they change
+        instance._rendered = {
+            field: instance.__dict__[field]
+            for field in MARKDOWN_FIELDS
+            if field in instance.__dict__
+        }
+        return instance
+
+    def save(self, *args, update_fields=None, **kwargs):
+        rendered = self.render_html(update_fields)
+        if update_fields is not None:
+            update_fields = {*update_fields, *rendered}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    def render_html(self, fields=None) -> list[str]:
+        """Render the HTML of the changed markdown fields, of `fields` if given.
+        Returns the updated HTML fields.
+        """
+
+        rendered = getattr(self, "_rendered", {})
+        updated = []
+        for field, html_field in MARKDOWN_FIELDS.items():
+            # Deferred fields aren't saved
+            if field not in self.__dict__ or (fields is not None and field not in fields):
+                continue
+            value = self.__dict__[field]
+            if field in rendered and rendered[field] == value:
+                continue
+            setattr(self, html_field, render_markdown(value))
+            rendered[field] = value
+            updated.append(html_field)
+        self._rendered = rendered
+        return updated
+
+    @property
+    def accuracy(self) -> float | None:
+        return self.correct_count / self.answers_count * 100 if self.answers_count else None
+
 
 class Choice(BaseDBModel):
     question = models.ForeignKey(
@@ -76,6 +146,8 @@ class Choice(BaseDBModel):
     )
     text = models.CharField(verbose_name="Texto", max_length=500)
     is_correct = models.BooleanField(verbose_name="Correta", default=False)
+    # Times it was chosen in the finished practices
+    picks_count = models.PositiveIntegerField(verbose_name="Escolhas", default=0)
 
     class Meta:
         verbose_name = "Alternativa"
@@ -92,6 +164,12 @@ class PracticeSession(BaseDBModel):
     questions_order = models.JSONField(verbose_name="Ordem das questões")  # ID list
     current_index = models.SmallIntegerField(verbose_name="Índice atual", default=0)
     finished_at = models.DateTimeField(verbose_name="Finalizado em", null=True)
+    # Results stored when the session is finished, it doesn't change after it
+    correct_count = models.PositiveSmallIntegerField(verbose_name="Acertos", null=True)
+    score = models.FloatField(verbose_name="Aproveitamento (%)", null=True)
+    duration = models.DurationField(verbose_name="Duração", null=True)
+    # {"question_id", "choice_id", "is_correct"} of each question, in the order of the session
+    results = models.JSONField(verbose_name="Resultados", null=True)
 
     if TYPE_CHECKING:
         answers: RelatedManager["PracticeAnswer"]
@@ -103,16 +181,99 @@ class PracticeSession(BaseDBModel):
     def __str__(self) -> str:
         return self.question_set.title
 
-    def get_unanswered_indexes(self):
-        answered_ids = set(self.answers.values_list("question_id", flat=True))  # pyright: ignore
-        unanswered_indexes = [
-            i for i, q_id in enumerate(self.questions_order) if q_id not in answered_ids
+    @property
+    def answered_count(self) -> int:
+        """Answered questions of the stored results."""
+        return sum(result["choice_id"] is not None for result in self.results or [])
+
+    def save_answers(self, answers: dict[str, str]) -> int:
+        """Save the answers of the session, {question_id: choice_id}, replacing the previous
+        answers of the same questions in a single query.
+        Answers to questions out of the session or with a choice of another question are
+        ignored. Returns the number of saved answers.
+        """
+
+        choices = Choice.objects.filter(
+            id__in=answers.values(), question_id__in=self.questions_order
+        ).values_list("id", "question_id")
+        objs = [
+            PracticeAnswer(session=self, question_id=question_id, choice_id=choice_id)
+            for choice_id, question_id in choices
+            if answers.get(question_id) == choice_id
         ]
-        return unanswered_indexes
+        if not objs:
+            return 0
 
-    def get_next_unanswered_index(self):
-        unanswered = self.get_unanswered_indexes()
-        return unanswered[0] if unanswered else None
+        # MySQL upserts on any unique key and doesn't accept the target fields
+        unique_fields = None
+        if connection.features.supports_update_conflicts_with_target:
+            unique_fields = ["session", "question"]
+        PracticeAnswer.objects.bulk_create(
+            objs, update_conflicts=True, update_fields=["choice"], unique_fields=unique_fields
+        )
+        return len(objs)
+
+    def store_results(self) -> None:
+        """Compute the results of a finished session and save them with it."""
+
+        answers = dict(self.answers.values_list("question_id", "choice_id"))  # pyright: ignore[reportArgumentType]
+        correct_choices = set(
+            Choice.objects.filter(id__in=answers.values(), is_correct=True).values_list(
+                "id", flat=True
+            )
+        )
+
+        self.results = [
+            {
+                "question_id": question_id,
+                "choice_id": answers.get(question_id),
+                "is_correct": answers.get(question_id) in correct_choices,
+            }
+            for question_id in self.questions_order
+        ]
+        self.correct_count = sum(result["is_correct"] for result in self.results)
+        self.score = self.correct_count / len(self.results) * 100 if self.results else 0
+        self.duration = self.finished_at - self.created_at if self.finished_at else None
+        self.save(update_fields=["finished_at", "results", "correct_count", "score", "duration"])
+
+    def update_question_stats(self) -> None:
+        """Add the stored results to the counters of the questions and the choices, with one
+        query for each counter.
+        """
+
+        answered = [result for result in self.results or [] if result["choice_id"] is not None]
+        if not answered:
+            return
+
+        Question.objects.filter(id__in=[result["question_id"] for result in answered]).update(
+            answers_count=models.F("answers_count") + 1
+        )
+        correct = [result["question_id"] for result in answered if result["is_correct"]]
+        if correct:
+            Question.objects.filter(id__in=correct).update(
+                correct_count=models.F("correct_count") + 1
+            )
+        Choice.objects.filter(id__in=[result["choice_id"] for result in answered]).update(
+            picks_count=models.F("picks_count") + 1
+        )
+
+    def finish(self) -> bool:
+        """Finish the session, storing its results and adding them to the counters.
+        Returns False if it was already finished, by a concurrent request for example.
+        """
+
+        finished_at = timezone.now()
+        with transaction.atomic():
+            # Claim the finish, so the results are only counted once
+            claimed = PracticeSession.objects.filter(id=self.id, finished_at=None).update(
+                finished_at=finished_at
+            )
+            if not claimed:
+                return False
+            self.finished_at = finished_at
+            self.store_results()
+            self.update_question_stats()
+        return True
 
 
 class PracticeAnswer(BaseDBModel):
@@ -125,6 +286,165 @@ class PracticeAnswer(BaseDBModel):
     class Meta:
         verbose_name = "Resposta da prática"
         verbose_name_plural = "Respostas das práticas"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "question"], name="unique_practice_answer_question"
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.choice.text
+
+
+class GenerationCacheEntry(BaseDBModel):
+    key = models.CharField(verbose_name="Chave", max_length=64, unique=True)
+    prompt = models.TextField(verbose_name="Prompt")
+    questions_number = models.SmallIntegerField(verbose_name="Número de questões")
+    model = models.CharField(verbose_name="Nome do modelo", max_length=100)
+    status = models.CharField(
+        verbose_name="Status",
+        max_length=20,
+        choices=[
+            ("pending", "Pendente"),
+            ("success", "Sucesso"),
+        ],
+    )
+    response = models.JSONField(verbose_name="Resposta", null=True)
+    hits = models.IntegerField(verbose_name="Acertos", default=0)
+    last_used_at = models.DateTimeField(verbose_name="Último uso", db_index=True)
+    expires_at = models.DateTimeField(verbose_name="Expira em", db_index=True)
+
+    class Meta:
+        verbose_name = "Cache de geração"
+        verbose_name_plural = "Cache de gerações"
+        ordering = ["-last_used_at"]
+
+    def __str__(self) -> str:
+        return self.prompt
+
+
+class GenerationCacheStats(BaseDBModel):
+    date = models.DateField(verbose_name="Data", unique=True)
+    hits = models.IntegerField(verbose_name="Acertos", default=0)
+    misses = models.IntegerField(verbose_name="Falhas", default=0)
+
+    class Meta:
+        verbose_name = "Estatística do cache de geração"
+        verbose_name_plural = "Estatísticas do cache de geração"
+        ordering = ["-date"]
+
+    def __str__(self) -> str:
+        return str(self.date)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total * 100 if total else 0
+
+
+class GenerationJob(BaseDBModel):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="generation_jobs", verbose_name="Usuário"
+    )
+    # Kept when the set is deleted, so it still counts in the daily quota
+    question_set = models.OneToOneField(
+        QuestionSet,
+        on_delete=models.SET_NULL,
+        related_name="generation_job",
+        verbose_name="Conjunto de questões",
+        null=True,
+    )
+    batch = models.ForeignKey(
+        "GenerationBatch",
+        on_delete=models.SET_NULL,
+        related_name="jobs",
+        verbose_name="Lote",
+        null=True,
+    )
+    questions_number = models.SmallIntegerField(verbose_name="Número de questões")
+    status = models.CharField(
+        verbose_name="Status",
+        max_length=20,
+        choices=[
+            ("queued", "Na fila"),
+            ("running", "Executando"),
+            ("done", "Finalizado"),
+        ],
+        db_index=True,
+    )
+    queued_at = models.DateTimeField(verbose_name="Enfileirado em", db_index=True)
+    started_at = models.DateTimeField(verbose_name="Iniciado em", null=True)
+    finished_at = models.DateTimeField(verbose_name="Finalizado em", null=True)
+
+    class Meta:
+        verbose_name = "Tarefa de geração"
+        verbose_name_plural = "Tarefas de geração"
+        ordering = ["-id"]
+
+    def __str__(self) -> str:
+        return str(self.question_set or self.id)
+
+
+class GenerationTelemetry(BaseDBModel):
+    # Kept when the set is deleted, so it still counts in the costs
+    question_set = models.OneToOneField(
+        QuestionSet,
+        on_delete=models.SET_NULL,
+        related_name="telemetry",
+        verbose_name="Conjunto de questões",
+        null=True,
+    )
+    model = models.CharField(verbose_name="Nome do modelo", max_length=100)
+    status = models.CharField(
+        verbose_name="Status",
+        max_length=20,
+        choices=[
+            ("success", "Sucesso"),
+            ("error", "Erro"),
+        ],
+    )
+    cached = models.BooleanField(verbose_name="Do cache", default=False)
+    questions_number = models.SmallIntegerField(verbose_name="Questões pedidas")
+    questions_count = models.SmallIntegerField(verbose_name="Questões geradas")
+    prompt_tokens = models.IntegerField(verbose_name="Tokens do prompt", default=0)
+    completion_tokens = models.IntegerField(verbose_name="Tokens da resposta", default=0)
+    # Seconds
+    queue_wait = models.FloatField(verbose_name="Espera na fila", null=True)
+    llm_latency = models.FloatField(verbose_name="Latência do LLM")
+    parse_time = models.FloatField(verbose_name="Tempo de validação")
+    db_write_time = models.FloatField(verbose_name="Tempo de escrita no banco")
+    cost = models.DecimalField(
+        verbose_name="Custo (USD)", max_digits=12, decimal_places=6, default=0
+    )
+    finished_at = models.DateTimeField(verbose_name="Finalizado em", db_index=True)
+
+    class Meta:
+        verbose_name = "Telemetria de geração"
+        verbose_name_plural = "Telemetria de gerações"
+        ordering = ["-finished_at"]
+
+    def __str__(self) -> str:
+        return str(self.question_set or self.id)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class GenerationBatch(BaseDBModel):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="generation_batches", verbose_name="Usuário"
+    )
+    name = models.CharField(verbose_name="Nome", max_length=255)
+    total = models.SmallIntegerField(verbose_name="Total de conjuntos")
+
+    if TYPE_CHECKING:
+        question_sets: RelatedManager["QuestionSet"]
+
+    class Meta:
+        verbose_name = "Lote de geração"
+        verbose_name_plural = "Lotes de geração"
+        ordering = ["-id"]
+
+    def __str__(self) -> str:
+        return self.name
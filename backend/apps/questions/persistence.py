@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.db import transaction
+from ulid import ULID
+
+from apps.common.markdown import render_markdown
+
+from .models import Choice, Question, QuestionSet
+
+if TYPE_CHECKING:
+    from . import service
+
+
+def _sequential_ulids(count: int) -> list[str]:
+    """Generate ULIDs sharing the same timestamp in increasing order.
+    Keep the rows in the order they were generated when sorted by id.
+    """
+
+    first = int(ULID())
+    return [str(ULID.from_int(first + i)) for i in range(count)]
+
+
+def save_questions(question_set: QuestionSet, questions: list[service.Question]) -> list[Question]:
+    """Insert the questions and their choices with one query for each table."""
+
+    question_ids = _sequential_ulids(len(questions))
+    choice_ids = iter(_sequential_ulids(sum(len(q.choices) for q in questions)))
+
+    _questions = []
+    choices = []
+    for question_id, question in zip(question_ids, questions):
+        _question = Question(
+            id=question_id,
+            question_set=question_set,
+            text=question.text,
+            type="multiple_choice",
+            explanation=question.explanation,
+            text_html=render_markdown(question.text),
+            explanation_html=render_markdown(question.explanation),
+        )
+        _questions.append(_question)
+        choices.extend(
+            Choice(
+                id=next(choice_ids),
+                question=_question,
+                text=choice.text,
+                is_correct=choice.is_correct,
+            )
+            for choice in question.choices
+        )
+
+    with transaction.atomic():
+        Question.objects.bulk_create(_questions)
+        Choice.objects.bulk_create(choices)
+
+    return _questions
+
+
+def save_response(
+    question_set: QuestionSet,
+    response: service.GenerateQuestionSetResponse,
+    model: str | None = None,
+) -> None:
+    """Save a complete response. `model` is the model that served it, the cached responses
+    are saved with AI_SERVICE_MODEL.
+    """
+
+    question_set.title = response.title
+    question_set.description = response.description
+    question_set.model = model or settings.AI_SERVICE_MODEL
+    question_set.save(update_fields=["title", "description", "model"])
+
+    save_questions(question_set, response.questions)
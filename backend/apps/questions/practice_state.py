@@ -0,0 +1,162 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.common.redis import get_async_redis, get_redis
+from apps.dashboard import stats
+
+from .models import PracticeSession
+
+log = logging.getLogger(__name__)
+
+KEY_PREFIX = "questions:practice:"
+# Sessions with changes not flushed yet, by the time of the first one
+DIRTY_KEY = "questions:practice:dirty"
+# Sessions with changes not flushed yet, by the time of the last one
+ACTIVE_KEY = "questions:practice:active"
+# Safety net for the states never flushed, the beat task flushes them much earlier
+STATE_TTL = 7 * 24 * 60 * 60
+
+# Drop the state only if it didn't change while it was flushed
+RELEASE_SCRIPT = """
+if redis.call("HGET", KEYS[1], "version") == ARGV[1] then
+    redis.call("DEL", KEYS[1])
+    redis.call("ZREM", KEYS[2], ARGV[2])
+    redis.call("ZREM", KEYS[3], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def _key(session_id: str) -> str:
+    return f"{KEY_PREFIX}{session_id}"
+
+
+async def aupdate(session_id: str, answers: dict[str, str], current_index: int) -> None:
+    """Record the answers and the position of an active practice, without touching the
+    database. They are written to it by `flush`.
+    """
+
+    now = time.time()
+    mapping = {f"answer:{question_id}": choice_id for question_id, choice_id in answers.items()}
+    mapping |= {"current_index": current_index, "updated_at": now}
+
+    async with get_async_redis().pipeline(transaction=True) as pipe:
+        pipe.hset(_key(session_id), mapping=mapping)
+        pipe.hincrby(_key(session_id), "version", 1)
+        pipe.expire(_key(session_id), STATE_TTL)
+        pipe.zadd(DIRTY_KEY, {session_id: now}, nx=True)
+        pipe.zadd(ACTIVE_KEY, {session_id: now})
+        await pipe.execute()
+
+
+def get(session_id: str) -> dict | None:
+    """State not flushed yet of a session, or None."""
+
+    data = get_redis().hgetall(_key(session_id))
+    if not data:
+        return None
+
+    state = {"answers": {}, "current_index": None, "version": None}
+    for field, value in data.items():  # pyright: ignore[reportAttributeAccessIssue]
+        field, value = field.decode(), value.decode()
+        if field.startswith("answer:"):
+            state["answers"][field.removeprefix("answer:")] = value
+        elif field in ("current_index", "version"):
+            state[field] = int(value)
+    return state
+
+
+def load(session: PracticeSession) -> tuple[dict[str, str], int]:
+    """Answers and current index of a session: the last flush, with the changes after it.
+    If Redis lost the state, the practice goes on from the last flush.
+    """
+
+    answers = dict(session.answers.values_list("question_id", "choice_id"))  # pyright: ignore[reportArgumentType]
+    current_index = session.current_index
+
+    state = get(session.id)
+    if state is not None:
+        answers |= state["answers"]
+        if state["current_index"] is not None:
+            current_index = state["current_index"]
+    return answers, current_index
+
+
+def flush(session: PracticeSession) -> None:
+    """Write the state of a session to the database and drop it from Redis."""
+
+    state = get(session.id)
+    if state is None:
+        return
+
+    with transaction.atomic():
+        session.save_answers(state["answers"])
+        if state["current_index"] is not None:
+            session.current_index = state["current_index"]
+            session.save(update_fields=["current_index"])
+
+    redis = get_redis()
+    script = redis.register_script(RELEASE_SCRIPT)
+    keys = [_key(session.id), DIRTY_KEY, ACTIVE_KEY]
+    if not script(keys=keys, args=[state["version"], session.id]):
+        # Changed meanwhile, the new changes are flushed later
+        redis.zadd(DIRTY_KEY, {session.id: time.time()}, xx=True)
+
+
+def discard(session_id: str) -> None:
+    with get_redis().pipeline(transaction=True) as pipe:
+        pipe.delete(_key(session_id))
+        pipe.zrem(DIRTY_KEY, session_id)
+        pipe.zrem(ACTIVE_KEY, session_id)
+        pipe.execute()
+
+
+def finish(session: PracticeSession) -> int | None:
+    """Flush the state of a session and finish it.
+    Returns the index of the first unanswered question instead, if there is one.
+    """
+
+    answers, _ = load(session)
+    for index, question_id in enumerate(session.questions_order):
+        if question_id not in answers:
+            return index
+
+    flush(session)
+    with transaction.atomic():
+        # Already finished by a concurrent request, which added it to the stats
+        if session.finish():
+            stats.practice_finished(session)
+    discard(session.id)
+    return None
+
+
+def flush_due() -> int:
+    """Flush the states idle for PRACTICE_STATE_IDLE_TIMEOUT or with changes older than
+    PRACTICE_STATE_FLUSH_INTERVAL. Returns the number of flushed sessions.
+    """
+
+    redis = get_redis()
+    now = time.time()
+    due = set(redis.zrangebyscore(ACTIVE_KEY, "-inf", now - settings.PRACTICE_STATE_IDLE_TIMEOUT))  # pyright: ignore[reportArgumentType]
+    due |= set(redis.zrangebyscore(DIRTY_KEY, "-inf", now - settings.PRACTICE_STATE_FLUSH_INTERVAL))  # pyright: ignore[reportArgumentType]
+    session_ids = [session_id.decode() for session_id in due]
+
+    sessions = PracticeSession.objects.filter(id__in=session_ids, finished_at=None).in_bulk()
+    flushed = 0
+    for session_id in session_ids:
+        session = sessions.get(session_id)
+        if session is None:
+            # Finished or deleted, the state is no longer needed
+            discard(session_id)
+            continue
+
+        try:
+            flush(session)
+            flushed += 1
+        except Exception as e:
+            log.exception(f"Error flushing the state of practice session {session_id}: {e}")
+    return flushed
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import random
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import TypeVar
+
+from django.conf import settings
+from openai import RateLimitError
+from ulid import ULID
+
+from apps.common.redis import get_async_redis, get_redis
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Lease of a concurrency slot, released earlier when the request finishes.
+# Slots of crashed workers are freed after it.
+SLOT_TTL_MS = 10 * 60 * 1000
+# Max sleep between two acquire attempts
+MAX_WAIT = 2
+
+# Take a request from the requests bucket, the tokens from the tokens bucket and a
+# concurrency slot, all or nothing. Buckets are refilled continuously up to the limit
+# per minute. Returns 0 on success or the milliseconds to wait before trying again.
+# A limit of 0 disables the check.
+ACQUIRE_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local tokens = math.min(tonumber(ARGV[3]), tpm)
+local concurrency = tonumber(ARGV[4])
+local slot = ARGV[5]
+local slot_ttl = tonumber(ARGV[6])
+
+local function refill(key, limit)
+    local bucket = redis.call("HMGET", key, "available", "ts")
+    local available = tonumber(bucket[1]) or limit
+    local ts = tonumber(bucket[2]) or now
+    return math.min(limit, available + (now - ts) * limit / 60000)
+end
+
+local wait = 0
+local requests = 0
+local available_tokens = 0
+
+if rpm > 0 then
+    requests = refill(KEYS[1], rpm)
+    if requests < 1 then
+        wait = math.max(wait, (1 - requests) * 60000 / rpm)
+    end
+end
+if tpm > 0 then
+    available_tokens = refill(KEYS[2], tpm)
+    if available_tokens < tokens then
+        wait = math.max(wait, (tokens - available_tokens) * 60000 / tpm)
+    end
+end
+if concurrency > 0 then
+    redis.call("ZREMRANGEBYSCORE", KEYS[3], "-inf", now)
+    if redis.call("ZCARD", KEYS[3]) >= concurrency then
+        wait = math.max(wait, 100)
+    end
+end
+
+if wait > 0 then
+    return math.ceil(wait)
+end
+
+if rpm > 0 then
+    redis.call("HSET", KEYS[1], "available", requests - 1, "ts", now)
+    redis.call("PEXPIRE", KEYS[1], 60000)
+end
+if tpm > 0 then
+    redis.call("HSET", KEYS[2], "available", available_tokens - tokens, "ts", now)
+    redis.call("PEXPIRE", KEYS[2], 60000)
+end
+if concurrency > 0 then
+    redis.call("ZADD", KEYS[3], now + slot_ttl, slot)
+    redis.call("PEXPIRE", KEYS[3], slot_ttl)
+end
+return 0
+"""
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class RateLimiter:
+    """Limits of the LLM provider for a model, shared by all the workers through Redis.
+
+    Configured in AI_SERVICE_RATE_LIMITS with requests per minute (rpm), tokens per
+    minute (tpm) and requests in flight (concurrency). When there is no capacity, the
+    caller waits for it instead of failing, up to AI_SERVICE_RATE_LIMIT_TIMEOUT.
+    """
+
+    def __init__(self, model: str) -> None:
+        limits = settings.AI_SERVICE_RATE_LIMITS.get(model, {})
+        self.model = model
+        self.rpm = int(limits.get("rpm", 0))
+        self.tpm = int(limits.get("tpm", 0))
+        self.concurrency = int(limits.get("concurrency", 0))
+        self.keys = [
+            f"ratelimit:{model}:requests",
+            f"ratelimit:{model}:tokens",
+            f"ratelimit:{model}:slots",
+        ]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rpm or self.tpm or self.concurrency)
+
+    def _args(self, tokens: int, slot: str) -> list:
+        return [self.rpm, self.tpm, tokens, self.concurrency, slot, SLOT_TTL_MS]
+
+    def _next_wait(self, wait_ms: int, deadline: float) -> float:
+        wait = min(wait_ms / 1000, MAX_WAIT) + random.uniform(0, 0.1)
+        if time.monotonic() + wait > deadline:
+            raise RateLimitTimeout(f"No capacity for model {self.model}")
+        return wait
+
+    @contextmanager
+    def slot(self, tokens: int) -> Iterator[None]:
+        """Hold a request of `tokens` estimated tokens."""
+
+        if not self.enabled:
+            yield
+            return
+
+        redis = get_redis()
+        script = redis.register_script(ACQUIRE_SCRIPT)
+        slot = str(ULID())
+        deadline = time.monotonic() + settings.AI_SERVICE_RATE_LIMIT_TIMEOUT
+
+        while True:
+            wait_ms = int(script(keys=self.keys, args=self._args(tokens, slot)))  # pyright: ignore[reportArgumentType]
+            if not wait_ms:
+                break
+            time.sleep(self._next_wait(wait_ms, deadline))
+
+        try:
+            yield
+        finally:
+            redis.zrem(self.keys[2], slot)
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int) -> AsyncIterator[None]:
+        """Async version of `slot`."""
+
+        if not self.enabled:
+            yield
+            return
+
+        redis = get_async_redis()
+        script = redis.register_script(ACQUIRE_SCRIPT)
+        slot = str(ULID())
+        deadline = time.monotonic() + settings.AI_SERVICE_RATE_LIMIT_TIMEOUT
+
+        while True:
+            wait_ms = int(await script(keys=self.keys, args=self._args(tokens, slot)))
+            if not wait_ms:
+                break
+            await asyncio.sleep(self._next_wait(wait_ms, deadline))
+
+        try:
+            yield
+        finally:
+            await redis.zrem(self.keys[2], slot)
+
+
+def _retry_delay(error: RateLimitError, attempt: int) -> float:
+    """Use the Retry-After header of the provider or an exponential backoff."""
+
+    try:
+        return float(error.response.headers.get("retry-after", ""))
+    except ValueError:
+        return min(2**attempt, 60) + random.random()
+
+
+def call_with_retries(func: Callable[[], T]) -> T:
+    """Call the provider, waiting and trying again when it answers with 429."""
+
+    for attempt in range(settings.AI_SERVICE_RATE_LIMIT_RETRIES):
+        try:
+            return func()
+        except RateLimitError as e:
+            delay = _retry_delay(e, attempt)
+            log.warning(f"Rate limited by the provider, trying again in {delay:.1f}s")
+            time.sleep(delay)
+    return func()
+
+
+async def acall_with_retries(func: Callable[[], Awaitable[T]]) -> T:
+    """Async version of `call_with_retries`."""
+
+    for attempt in range(settings.AI_SERVICE_RATE_LIMIT_RETRIES):
+        try:
+            return await func()
+        except RateLimitError as e:
+            delay = _retry_delay(e, attempt)
+            log.warning(f"Rate limited by the provider, trying again in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    return await func()
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from django.conf import settings
+from openai import AsyncOpenAI, Client
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Requests kept in the rolling stats of each backend
+WINDOW = 50
+# Requests needed before using the latency of a backend to hedge
+MIN_SAMPLES = 10
+
+
+class Backend:
+    """An OpenAI compatible endpoint and model, with the rolling stats of its requests.
+
+    The stats are kept in memory, each worker process learns them on its own.
+    """
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str) -> None:
+        self.name = name
+        self.model = model
+        self.client = Client(api_key=api_key, base_url=base_url)
+        self.async_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        # Seconds per requested question, the requests have different sizes
+        self._latencies: deque[float] = deque(maxlen=WINDOW)
+        self._errors: deque[bool] = deque(maxlen=WINDOW)
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"<Backend {self.name} ({self.model})>"
+
+    def record_success(self, latency: float, size: int) -> None:
+        with self._lock:
+            self._latencies.append(latency / max(size, 1))
+            self._errors.append(False)
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._errors.append(True)
+            self._failures += 1
+            if self._failures >= settings.AI_SERVICE_BREAKER_FAILURES:
+                if self._opened_at is None:
+                    log.warning(f"Circuit breaker opened for {self}")
+                # Also opened again when the trial request after the cooldown fails
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the circuit breaker is blocking the requests.
+        After AI_SERVICE_BREAKER_COOLDOWN seconds, requests are let through to try it again.
+        """
+
+        if self._opened_at is None:
+            return False
+        return time.monotonic() - self._opened_at < settings.AI_SERVICE_BREAKER_COOLDOWN
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self._errors) / len(self._errors) if self._errors else 0
+
+    def latency(self, percent: int, size: int) -> float | None:
+        """Expected latency percentile of a request of `size` questions,
+        or None while there are few samples.
+        """
+
+        latencies = sorted(self._latencies)
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return statistics.quantiles(latencies, n=100, method="inclusive")[percent - 1] * size
+
+
+def load_backends() -> list[Backend]:
+    """Backends of AI_SERVICE_BACKENDS, or the single AI_SERVICE_* backend."""
+
+    if not settings.AI_SERVICE_BACKENDS:
+        return [
+            Backend(
+                "default",
+                settings.AI_SERVICE_BASE_URL,
+                settings.AI_SERVICE_API_KEY,
+                settings.AI_SERVICE_MODEL,
+            )
+        ]
+
+    return [
+        Backend(
+            backend.get("name", backend["model"]),
+            backend["base_url"],
+            backend["api_key"],
+            backend["model"],
+        )
+        for backend in settings.AI_SERVICE_BACKENDS
+    ]
+
+
+class Router:
+    """Send each request to the best backend.
+
+    Backends are ranked by their median latency and error rate. Failing backends are
+    skipped by their circuit breaker and a failed request moves on to the next backend.
+    With AI_SERVICE_HEDGING, an async request still running after the p95 latency of its
+    backend is also sent to the next one, the first reply wins and the other is cancelled.
+    """
+
+    def __init__(self, backends: list[Backend]) -> None:
+        self.backends = backends
+
+    def ranked(self) -> list[Backend]:
+        """Backends in order of preference. The open ones are only used if all are open."""
+
+        def score(backend: Backend) -> float:
+            # Backends without samples come first, to learn their latency
+            latency = backend.latency(50, 1) or 0
+            return latency / max(1 - backend.error_rate, 0.1)
+
+        closed = [b for b in self.backends if not b.is_open]
+        return sorted(closed or self.backends, key=score)
+
+    def _hedge_delay(self, backend: Backend, size: int) -> float | None:
+        if not settings.AI_SERVICE_HEDGING:
+            return None
+        return backend.latency(95, size)
+
+    def _run(self, backend: Backend, func: Callable[[Backend], T], size: int) -> T:
+        start = time.perf_counter()
+        try:
+            result = func(backend)
+        except Exception:
+            backend.record_failure()
+            raise
+        backend.record_success(time.perf_counter() - start, size)
+        return result
+
+    def call(self, func: Callable[[Backend], T], size: int) -> tuple[Backend, T]:
+        """Call `func` with the backends until one succeeds.
+        Returns the backend that served the request and its result.
+
+        Not hedged: a losing request in a thread can't be stopped, it would spend the tokens
+        and hold its rate limiter slot until the end. Only `acall` hedges.
+        """
+
+        error: Exception | None = None
+        for backend in self.ranked():
+            try:
+                return backend, self._run(backend, func, size)
+            except Exception as e:
+                log.warning(f"Request to {backend} failed: {e}")
+                error = e
+
+        raise error or RuntimeError("No AI service backend")
+
+    async def acall(self, func: Callable[[Backend], Awaitable[T]], size: int) -> tuple[Backend, T]:
+        """Async version of `call`. The losing hedged request is cancelled."""
+
+        async def run(backend: Backend) -> T:
+            start = time.perf_counter()
+            try:
+                result = await func(backend)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                backend.record_failure()
+                raise
+            backend.record_success(time.perf_counter() - start, size)
+            return result
+
+        candidates = iter(self.ranked())
+        running: dict[asyncio.Task, Backend] = {}
+        error: Exception | None = None
+
+        def start_next() -> Backend | None:
+            backend = next(candidates, None)
+            if backend is not None:
+                running[asyncio.create_task(run(backend))] = backend
+            return backend
+
+        try:
+            first = start_next()
+            timeout = self._hedge_delay(first, size) if first else None
+            while running:
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    timeout = None
+                    if (backend := start_next()) is not None:
+                        log.info(f"Hedging the request to {backend}")
+                    continue
+
+                for task in done:
+                    backend = running.pop(task)
+                    try:
+                        return backend, task.result()
+                    except Exception as e:
+                        log.warning(f"Request to {backend} failed: {e}")
+                        error = e
+                if not running:
+                    start_next()
+        finally:
+            for task in running:
+                task.cancel()
+
+        raise error or RuntimeError("No AI service backend")
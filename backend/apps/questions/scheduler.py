@@ -0,0 +1,260 @@
+import logging
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.common.redis import get_redis
+
+from .models import GenerationJob, QuestionSet
+from .persistence import _sequential_ulids
+
+log = logging.getLogger(__name__)
+
+# Serializes the drains of all the processes
+LOCK_KEY = "questions:scheduler:lock"
+
+
+def _check_quota(user: User, count: int) -> str | None:
+    quota = settings.GENERATION_USER_DAILY_QUOTA
+    if not quota:
+        return None
+
+    today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    used = GenerationJob.objects.filter(user=user, queued_at__gte=today).count()
+    if used + count > quota:
+        return (
+            f"Você atingiu o limite de {quota} gerações por dia "
+            f"({max(quota - used, 0)} restantes), tente novamente amanhã."
+        )
+    return None
+
+
+def check_admission(user: User) -> str | None:
+    """Check the limits of the user before queuing a generation.
+    Returns the error message to show, or None if the generation is allowed.
+    """
+
+    error = _check_quota(user, 1)
+    if error:
+        return error
+
+    active = GenerationJob.objects.filter(
+        user=user, batch=None, status__in=["queued", "running"]
+    ).count()
+    if active >= settings.GENERATION_USER_MAX_JOBS:
+        return "Você já tem muitas questões sendo geradas no momento, por favor, aguarde."
+
+    return None
+
+
+def check_batch_admission(user: User, count: int) -> str | None:
+    """Same as `check_admission`, for a batch of `count` sets.
+    A user can have a single batch in progress.
+    """
+
+    error = _check_quota(user, count)
+    if error:
+        return error
+
+    if GenerationJob.objects.filter(
+        user=user, batch__isnull=False, status__in=["queued", "running"]
+    ).exists():
+        return "Você já tem um lote sendo gerado no momento, por favor, aguarde."
+
+    return None
+
+
+def _new_job(question_set: QuestionSet, questions_number: int) -> GenerationJob:
+    return GenerationJob(
+        user_id=question_set.user_id,  # pyright: ignore[reportAttributeAccessIssue]
+        question_set=question_set,
+        batch_id=question_set.batch_id,  # pyright: ignore[reportAttributeAccessIssue]
+        questions_number=questions_number,
+        status="queued",
+        queued_at=timezone.now(),
+    )
+
+
+def enqueue(question_set: QuestionSet, questions_number: int) -> GenerationJob:
+    """Queue the generation of a set. It starts in the next drain."""
+
+    job = _new_job(question_set, questions_number)
+    job.save()
+    return job
+
+
+def enqueue_many(question_sets: list[QuestionSet], questions_numbers: list[int]) -> None:
+    """Queue the generation of many sets, in this order."""
+
+    jobs = [
+        _new_job(question_set, questions_number)
+        for question_set, questions_number in zip(question_sets, questions_numbers, strict=True)
+    ]
+    for job, job_id in zip(jobs, _sequential_ulids(len(jobs)), strict=True):
+        job.id = job_id
+    GenerationJob.objects.bulk_create(jobs)
+
+
+def _lane(user_id: str, batch_id: str | None) -> str:
+    """Jobs take turns by lane: each batch has its own lane, the single sets use the
+    lane of the user.
+    """
+
+    return batch_id or user_id
+
+
+def _lane_limit(lane: str, user_id: str) -> int:
+    if lane == user_id:
+        return settings.GENERATION_USER_CONCURRENCY
+    return settings.GENERATION_BATCH_CONCURRENCY
+
+
+def complete(question_set_id: str) -> bool:
+    """Mark the job of a finished set as done. Returns whether a running job was freed."""
+
+    return bool(
+        GenerationJob.objects.filter(question_set_id=question_set_id, status="running").update(
+            status="done", finished_at=timezone.now()
+        )
+    )
+
+
+def _release_finished() -> None:
+    """Free the jobs that finished without calling `complete`: sets deleted or already
+    finished, and the lost ones, running for longer than GENERATION_JOB_TIMEOUT.
+    """
+
+    now = timezone.now()
+    GenerationJob.objects.filter(
+        Q(question_set=None) | ~Q(question_set__status="pending"),
+        status__in=["queued", "running"],
+    ).update(status="done", finished_at=now)
+
+    lost = GenerationJob.objects.filter(
+        status="running", started_at__lt=now - timedelta(seconds=settings.GENERATION_JOB_TIMEOUT)
+    )
+    question_set_ids = list(lost.values_list("question_set_id", flat=True))
+    if question_set_ids:
+        log.warning(f"Generation jobs lost for question sets {question_set_ids}")
+        QuestionSet.objects.filter(id__in=question_set_ids, status="pending").update(status="error")
+        lost.update(status="done", finished_at=now)
+
+
+def drain() -> list[GenerationJob]:
+    """Pick the queued jobs to start, while there is free capacity.
+
+    Lanes (users or batches) take turns: each round starts one job of each lane,
+    beginning with the lanes that waited the longest since their last job, so a user with
+    many jobs queued can't starve the others. The picked jobs are marked as running and
+    must be dispatched by the caller.
+    """
+
+    with get_redis().lock(LOCK_KEY, timeout=30, blocking_timeout=10), transaction.atomic():
+        _release_finished()
+
+        running = Counter(
+            _lane(user_id, batch_id)
+            for user_id, batch_id in GenerationJob.objects.filter(status="running").values_list(
+                "user_id", "batch_id"
+            )
+        )
+        free = settings.GENERATION_MAX_RUNNING - running.total()
+        if free <= 0:
+            return []
+
+        queued: dict[str, deque[GenerationJob]] = defaultdict(deque)
+        lane_users = {}
+        for job in (
+            GenerationJob.objects.filter(status="queued")
+            .select_related("question_set")
+            .order_by("id")
+        ):
+            lane = _lane(job.user_id, job.batch_id)  # pyright: ignore[reportAttributeAccessIssue]
+            queued[lane].append(job)
+            lane_users[lane] = job.user_id  # pyright: ignore[reportAttributeAccessIssue]
+
+        last_started: dict[str, datetime] = {
+            _lane(user_id, batch_id): last
+            for user_id, batch_id, last in GenerationJob.objects.filter(
+                user_id__in=set(lane_users.values()), started_at__isnull=False
+            )
+            .values("user_id", "batch_id")
+            .annotate(last=Max("started_at"))
+            .values_list("user_id", "batch_id", "last")
+        }
+        lanes = sorted(
+            queued,
+            key=lambda lane: (lane in last_started, last_started.get(lane), queued[lane][0].id),
+        )
+
+        started = []
+        while free > 0 and lanes:
+            for lane in list(lanes):
+                if free <= 0:
+                    break
+                if not queued[lane] or running[lane] >= _lane_limit(lane, lane_users[lane]):
+                    lanes.remove(lane)
+                    continue
+                started.append(queued[lane].popleft())
+                running[lane] += 1
+                free -= 1
+
+        GenerationJob.objects.filter(id__in=[job.id for job in started]).update(
+            status="running", started_at=timezone.now()
+        )
+
+    return started
+
+
+def queue_position(question_set_id: str) -> int | None:
+    """Position of a queued set, estimated from the round-robin order.
+    Returns None if it isn't queued.
+    """
+
+    job = (
+        GenerationJob.objects.filter(question_set_id=question_set_id, status="queued")
+        .values("id", "user_id", "batch_id")
+        .first()
+    )
+    if job is None:
+        return None
+
+    queued: dict[str, list[str]] = defaultdict(list)
+    for job_id, user_id, batch_id in (
+        GenerationJob.objects.filter(status="queued")
+        .order_by("id")
+        .values_list("id", "user_id", "batch_id")
+    ):
+        queued[_lane(user_id, batch_id)].append(job_id)
+
+    # The jobs of the other lanes in the turns before go first,
+    # and the ones in the same turn if they were queued before
+    job_lane = _lane(job["user_id"], job["batch_id"])
+    turn = queued[job_lane].index(job["id"])
+    ahead = sum(
+        min(len(ids), turn) + (len(ids) > turn and ids[turn] < job["id"])
+        for lane, ids in queued.items()
+        if lane != job_lane
+    )
+    return turn + ahead + 1
+
+
+def queue_stats() -> dict:
+    """Depth of the queue, used to autoscale the workers."""
+
+    jobs = GenerationJob.objects.filter(status__in=["queued", "running"])
+    counts = Counter(jobs.values_list("status", flat=True))
+    oldest = jobs.filter(status="queued").order_by("id").values_list("queued_at", flat=True).first()
+
+    return {
+        "queued": counts["queued"],
+        "running": counts["running"],
+        "users": jobs.filter(status="queued").values("user_id").distinct().count(),
+        "capacity": settings.GENERATION_MAX_RUNNING,
+        "oldest_wait": (timezone.now() - oldest).total_seconds() if oldest else 0,
+    }
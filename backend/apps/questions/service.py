@@ -1,17 +1,30 @@
-import json
+import logging
 import math
 import random
-from collections import defaultdict
-from typing import cast
+import re
+import time
+from collections import Counter, defaultdict
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
 
 from django.conf import settings
-from openai import Client
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
-client = Client(
-    api_key=settings.AI_SERVICE_API_KEY,
-    base_url=settings.AI_SERVICE_BASE_URL,
-)
+from .ratelimit import RateLimiter, acall_with_retries, call_with_retries
+from .router import Backend, Router, load_backends
+from .streaming import QuestionStreamParser
+
+log = logging.getLogger(__name__)
+
+# Number of alternatives requested for each question
+QUESTION_CHOICES = 4
+# Used to estimate the tokens of a generation before the request
+CHARS_PER_TOKEN = 4
+ESTIMATED_TOKENS_PER_QUESTION = 250
+# Max characters of each existing question sent when asking for the missing ones
+AVOID_TEXT_LENGTH = 200
+
+router = Router(load_backends())
 
 
 class Choice(BaseModel):
@@ -31,18 +44,49 @@ class GenerateQuestionSetResponse(BaseModel):
     questions: list[Question]
 
 
-def _shuffle_choices(questions: list[Question]) -> None:
+class GenerationStats(BaseModel):
+    """Usage and timings of a generation, saved in its telemetry."""
+
+    model: str = ""  # Model that served the generation
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    llm_latency: float = 0  # Seconds waiting for the LLM
+    parse_time: float = 0  # Seconds parsing and validating the reply
+    cached: bool = False
+
+    def add_usage(self, usage: Any) -> None:
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+
+    def merge(self, shards: list["GenerationStats"]) -> None:
+        """Add the stats of the shards. They run in parallel, so the latency is the slowest."""
+
+        if shards:
+            # Shards may be served by different backends, keep the one that did most
+            self.model = Counter(s.model for s in shards).most_common(1)[0][0]
+        self.prompt_tokens += sum(s.prompt_tokens for s in shards)
+        self.completion_tokens += sum(s.completion_tokens for s in shards)
+        self.llm_latency += max((s.llm_latency for s in shards), default=0)
+        self.parse_time += sum(s.parse_time for s in shards)
+
+
+class _ChoiceBalancer:
     """Reorder the question choices.
     Keep the correct alternative of the question in a balanced index.
     Ex: if there are 20 questions with 4 choices each,
     the index of the correct choice will be 4x0, 4x1, 4x2,4x3 or 25% each.
     """
 
-    num_choices = max(len(q.choices) for q in questions)
-    indexes_count = defaultdict(int)
-    max_per_index = math.ceil(len(questions) / num_choices)
+    def __init__(self, total: int, num_choices: int) -> None:
+        self.num_choices = num_choices
+        self.indexes_count = defaultdict(int)
+        self.max_per_index = math.ceil(total / num_choices)
+
+    def shuffle(self, question: Question) -> None:
+        num_choices = self.num_choices
+        indexes_count = self.indexes_count
 
-    for question in questions:
         correct_choice = next(c for c in question.choices if c.is_correct)
         incorrect_choices = [c for c in question.choices if not c.is_correct]
 
@@ -51,7 +95,7 @@ def _shuffle_choices(questions: list[Question]) -> None:
         available_indexes = [
             i
             for i in range(num_choices)
-            if indexes_count[i] == min_used and indexes_count[i] < max_per_index
+            if indexes_count[i] == min_used and indexes_count[i] < self.max_per_index
         ]
 
         # If all indexes are full, use any one
@@ -72,11 +116,46 @@ def _shuffle_choices(questions: list[Question]) -> None:
         question.choices = new_order
 
 
-def generate_questions(prompt: str, count: int) -> GenerateQuestionSetResponse:
+def _shuffle_choices(questions: list[Question]) -> None:
+    """Balance the correct choice index across all the questions."""
+
+    num_choices = max(len(q.choices) for q in questions)
+    balancer = _ChoiceBalancer(len(questions), num_choices)
+    for question in questions:
+        balancer.shuffle(question)
+
+
+def split_shards(questions_number: int, shard_size: int) -> list[int]:
+    """Split the number of questions in shards of (almost) the same size.
+    Ex: 25 questions with shard size 10 -> [9, 8, 8]
+    """
+
+    shards = math.ceil(questions_number / shard_size)
+    base, extra = divmod(questions_number, shards)
+    return [base + 1 if i < extra else base for i in range(shards)]
+
+
+def _is_valid_question(question: Question) -> bool:
+    return (
+        len(question.choices) == QUESTION_CHOICES
+        and sum(c.is_correct for c in question.choices) == 1
+    )
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.casefold()).split())
+
+
+def _build_messages(
+    prompt: str,
+    count: int,
+    shard: tuple[int, int] | None = None,
+    avoid: list[str] | None = None,
+) -> list:
     system_prompt = f"""You are a helpful assistant specialized in creating educational
     multiple-choice questions in Portuguese (Brazil).
     The user will provide a prompt and you will parse and create {count} questions.
-    Each question must have 4 alternatives and an explanation.
+    Each question must have {QUESTION_CHOICES} alternatives and an explanation.
     The model supports Markdown formatting, including headings, lists, code blocks, tables,
     and inline formatting.
 
@@ -99,19 +178,447 @@ def generate_questions(prompt: str, count: int) -> GenerateQuestionSetResponse:
     }}
     """
 
-    response = client.chat.completions.create(
-        model=settings.AI_SERVICE_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_object"},
-        temperature=1.3,
-        stream=False,
-    )
-    text = cast(str, response.choices[0].message.content)
-    data = json.loads(text)
+    if shard is not None:
+        index, total = shard
+        system_prompt += f"""
+    This request is part {index + 1} of {total} of a larger set generated in parallel.
+    Cover different subtopics of the prompt to avoid repeating questions from the other parts.
+    """
 
-    res = GenerateQuestionSetResponse(**data)
-    _shuffle_choices(res.questions)
+    if avoid:
+        existing = "\n".join(f"    - {text[:AVOID_TEXT_LENGTH]}" for text in avoid)
+        system_prompt += f"""
+    These questions were already created, don't repeat them:
+{existing}
+    """
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _strict_schema(schema: dict) -> dict:
+    """Adapt the JSON schema of the pydantic models to the strict structured output:
+    every object must list all its properties as required and forbid the others.
+    """
+
+    if schema.get("type") == "object":
+        schema["additionalProperties"] = False
+        schema["required"] = list(schema.get("properties", {}))
+    for value in schema.values():
+        items = value if isinstance(value, list) else [value]
+        for item in items:
+            if isinstance(item, dict):
+                _strict_schema(item)
+    return schema
+
+
+RESPONSE_SCHEMA = _strict_schema(GenerateQuestionSetResponse.model_json_schema())
+
+
+def _response_format() -> dict:
+    if settings.AI_SERVICE_RESPONSE_FORMAT == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "question_set", "strict": True, "schema": RESPONSE_SCHEMA},
+        }
+    return {"type": "json_object"}
+
+
+def _completion_kwargs(
+    prompt: str,
+    count: int,
+    shard: tuple[int, int] | None = None,
+    stream: bool = False,
+    avoid: list[str] | None = None,
+) -> dict:
+    # The model is set by the backend that serves the request
+    kwargs = {
+        "messages": _build_messages(prompt, count, shard, avoid),
+        "response_format": _response_format(),
+        "temperature": 1.3,
+        "stream": stream,
+    }
+    if stream:
+        # The usage is sent in the last chunk
+        kwargs["stream_options"] = {"include_usage": True}
+    return kwargs
+
+
+def _estimate_tokens(kwargs: dict, count: int) -> int:
+    """Estimate the tokens of a request, reserved from the tokens per minute limit."""
+
+    prompt_tokens = sum(len(m["content"]) for m in kwargs["messages"]) // CHARS_PER_TOKEN
+    return prompt_tokens + count * ESTIMATED_TOKENS_PER_QUESTION
+
+
+def _salvage_response(text: str) -> GenerateQuestionSetResponse:
+    """Keep the valid questions of an invalid or truncated reply."""
+
+    parts = {"title": "", "description": ""}
+    questions = []
+    for key, value in QuestionStreamParser().feed(text):
+        if key != "question":
+            parts[key] = value
+            continue
+        try:
+            question = Question.model_validate(value)
+        except ValidationError:
+            continue
+        if _is_valid_question(question):
+            questions.append(question)
+
+    return GenerateQuestionSetResponse(**parts, questions=questions)
+
+
+def _parse_response(text: str, stats: GenerationStats) -> GenerateQuestionSetResponse:
+    """Validate the reply straight from the raw text.
+    The invalid questions are dropped instead of failing the whole set.
+    """
+
+    start = time.perf_counter()
+    try:
+        res = GenerateQuestionSetResponse.model_validate_json(text)
+        questions = [q for q in res.questions if _is_valid_question(q)]
+        if len(questions) < len(res.questions):
+            log.warning(f"Skipping {len(res.questions) - len(questions)} invalid questions")
+        res.questions = questions
+    except ValidationError as e:
+        res = _salvage_response(text)
+        log.warning(f"Invalid reply, salvaged {len(res.questions)} questions: {e}")
+
+    if res.questions:
+        _shuffle_choices(res.questions)
+    stats.parse_time += time.perf_counter() - start
     return res
+
+
+def _add_questions(
+    response: GenerateQuestionSetResponse, extra: GenerateQuestionSetResponse
+) -> GenerateQuestionSetResponse:
+    """Add the questions of `extra` that aren't in `response` yet."""
+
+    seen = {_normalize_text(q.text) for q in response.questions}
+    questions = list(response.questions)
+    for question in extra.questions:
+        key = _normalize_text(question.text)
+        if key not in seen:
+            seen.add(key)
+            questions.append(question)
+
+    return GenerateQuestionSetResponse(
+        title=response.title or extra.title,
+        description=response.description or extra.description,
+        questions=questions,
+    )
+
+
+def _request(kwargs: dict, count: int, stats: GenerationStats) -> GenerateQuestionSetResponse:
+    def create(backend: Backend) -> tuple[Any, float]:
+        with RateLimiter(backend.model).slot(_estimate_tokens(kwargs, count)):
+            start = time.perf_counter()
+            response = call_with_retries(
+                lambda: backend.client.chat.completions.create(model=backend.model, **kwargs)
+            )
+            return response, time.perf_counter() - start
+
+    backend, (response, latency) = router.call(create, count)
+    stats.model = backend.model
+    stats.llm_latency += latency
+    stats.add_usage(response.usage)
+    return _parse_response(response.choices[0].message.content or "", stats)
+
+
+async def _arequest(
+    kwargs: dict, count: int, stats: GenerationStats
+) -> GenerateQuestionSetResponse:
+    async def create(backend: Backend) -> tuple[Any, float]:
+        async with RateLimiter(backend.model).aslot(_estimate_tokens(kwargs, count)):
+            start = time.perf_counter()
+            response = await acall_with_retries(
+                lambda: backend.async_client.chat.completions.create(model=backend.model, **kwargs)
+            )
+            return response, time.perf_counter() - start
+
+    backend, (response, latency) = await router.acall(create, count)
+    stats.model = backend.model
+    stats.llm_latency += latency
+    stats.add_usage(response.usage)
+    return _parse_response(response.choices[0].message.content or "", stats)
+
+
+def _complete_missing(
+    prompt: str,
+    count: int,
+    response: GenerateQuestionSetResponse,
+    shard: tuple[int, int] | None,
+    stats: GenerationStats,
+) -> GenerateQuestionSetResponse:
+    """Ask the model only for the questions missing in the response,
+    up to AI_SERVICE_REPAIR_ATTEMPTS times.
+    """
+
+    for _ in range(settings.AI_SERVICE_REPAIR_ATTEMPTS):
+        missing = count - len(response.questions)
+        if missing <= 0:
+            break
+        log.info(f"Asking the model for {missing} missing questions")
+        avoid = [q.text for q in response.questions]
+        kwargs = _completion_kwargs(prompt, missing, shard, avoid=avoid)
+        response = _add_questions(response, _request(kwargs, missing, stats))
+    return response
+
+
+async def _acomplete_missing(
+    prompt: str,
+    count: int,
+    response: GenerateQuestionSetResponse,
+    shard: tuple[int, int] | None,
+    stats: GenerationStats,
+) -> GenerateQuestionSetResponse:
+    """Async version of `_complete_missing`."""
+
+    for _ in range(settings.AI_SERVICE_REPAIR_ATTEMPTS):
+        missing = count - len(response.questions)
+        if missing <= 0:
+            break
+        log.info(f"Asking the model for {missing} missing questions")
+        avoid = [q.text for q in response.questions]
+        kwargs = _completion_kwargs(prompt, missing, shard, avoid=avoid)
+        response = _add_questions(response, await _arequest(kwargs, missing, stats))
+    return response
+
+
+def generate_questions(
+    prompt: str,
+    count: int,
+    shard: tuple[int, int] | None = None,
+    stats: GenerationStats | None = None,
+) -> GenerateQuestionSetResponse:
+    """Generate the questions in a single request, plus the requests for the missing ones.
+    The usage and timings are added to `stats`, if given.
+    """
+
+    stats = stats if stats is not None else GenerationStats()
+    kwargs = _completion_kwargs(prompt, count, shard)
+
+    response = _request(kwargs, count, stats)
+    response = _complete_missing(prompt, count, response, shard, stats)
+    if not response.questions:
+        raise ValueError("The reply has no valid question")
+    return response
+
+
+async def agenerate_questions(
+    prompt: str,
+    count: int,
+    shard: tuple[int, int] | None = None,
+    stats: GenerationStats | None = None,
+) -> GenerateQuestionSetResponse:
+    """Async version of `generate_questions`."""
+
+    stats = stats if stats is not None else GenerationStats()
+    kwargs = _completion_kwargs(prompt, count, shard)
+
+    response = await _arequest(kwargs, count, stats)
+    response = await _acomplete_missing(prompt, count, response, shard, stats)
+    if not response.questions:
+        raise ValueError("The reply has no valid question")
+    return response
+
+
+def merge_responses(responses: list[GenerateQuestionSetResponse]) -> GenerateQuestionSetResponse:
+    """Merge the responses of a sharded generation.
+    Duplicated questions across the shards are removed and the correct choices are
+    balanced again over the merged set.
+    """
+
+    seen = set()
+    questions = []
+    for response in responses:
+        for question in response.questions:
+            key = _normalize_text(question.text)
+            if key in seen:
+                continue
+            seen.add(key)
+            questions.append(question)
+
+    _shuffle_choices(questions)
+    return GenerateQuestionSetResponse(
+        title=responses[0].title,
+        description=responses[0].description,
+        questions=questions,
+    )
+
+
+class _StreamProcessor:
+    """Turn the streamed content into validated parts of the set."""
+
+    def __init__(self, count: int, stats: GenerationStats) -> None:
+        self.parser = QuestionStreamParser()
+        self.balancer = _ChoiceBalancer(count, QUESTION_CHOICES)
+        self.stats = stats
+        self.questions: list[Question] = []
+
+    def feed(self, chunk: Any) -> list[tuple[str, Any]]:
+        self.stats.add_usage(getattr(chunk, "usage", None))
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            return []
+
+        start = time.perf_counter()
+        parts = []
+        for key, value in self.parser.feed(chunk.choices[0].delta.content):
+            if key != "question":
+                parts.append((key, value))
+                continue
+
+            try:
+                question = Question(**value)
+            except ValidationError as e:
+                log.warning(f"Skipping invalid streamed question: {e}")
+                continue
+
+            if not _is_valid_question(question):
+                log.warning("Skipping streamed question without a single correct choice")
+                continue
+
+            self.balancer.shuffle(question)
+            self.questions.append(question)
+            parts.append((key, question))
+
+        self.stats.parse_time += time.perf_counter() - start
+        return parts
+
+
+def _stream_chunks(kwargs: dict, count: int, stats: GenerationStats) -> Iterator[Any]:
+    """Stream the reply of the best backend, holding its slot until the end.
+    Fails over to the next backend while nothing was received, streams aren't hedged.
+    """
+
+    error = None
+    for backend in router.ranked():
+        received = False
+        paused = 0.0
+        try:
+            with RateLimiter(backend.model).slot(_estimate_tokens(kwargs, count)):
+                start = time.perf_counter()
+                stream = call_with_retries(
+                    lambda: backend.client.chat.completions.create(model=backend.model, **kwargs)
+                )
+                stats.model = backend.model
+                for chunk in stream:
+                    received = True
+                    pause_start = time.perf_counter()
+                    yield chunk
+                    paused += time.perf_counter() - pause_start
+        except Exception as e:
+            backend.record_failure()
+            if received:
+                raise
+            log.warning(f"Stream from {backend} failed: {e}")
+            error = e
+            continue
+
+        backend.record_success(time.perf_counter() - start - paused, count)
+        return
+
+    raise error or RuntimeError("No AI service backend")
+
+
+async def _astream_chunks(kwargs: dict, count: int, stats: GenerationStats) -> AsyncIterator[Any]:
+    """Async version of `_stream_chunks`."""
+
+    error = None
+    for backend in router.ranked():
+        received = False
+        paused = 0.0
+        try:
+            async with RateLimiter(backend.model).aslot(_estimate_tokens(kwargs, count)):
+                start = time.perf_counter()
+                stream = await acall_with_retries(
+                    lambda: backend.async_client.chat.completions.create(
+                        model=backend.model, **kwargs
+                    )
+                )
+                stats.model = backend.model
+                async for chunk in stream:
+                    received = True
+                    pause_start = time.perf_counter()
+                    yield chunk
+                    paused += time.perf_counter() - pause_start
+        except Exception as e:
+            backend.record_failure()
+            if received:
+                raise
+            log.warning(f"Stream from {backend} failed: {e}")
+            error = e
+            continue
+
+        backend.record_success(time.perf_counter() - start - paused, count)
+        return
+
+    raise error or RuntimeError("No AI service backend")
+
+
+def stream_questions(
+    prompt: str, count: int, stats: GenerationStats | None = None
+) -> Iterator[tuple[str, Any]]:
+    """Stream the generation, yielding each part of the set as soon as it is complete.
+
+    Yields `("title", str)`, `("description", str)` and `("question", Question)`.
+    Invalid questions are skipped, so a set may end up with fewer questions than requested.
+    The usage and timings are added to `stats`, if given. The time spent by the caller
+    between the parts is not counted in the LLM latency.
+    """
+
+    stats = stats if stats is not None else GenerationStats()
+    kwargs = _completion_kwargs(prompt, count, stream=True)
+    processor = _StreamProcessor(count, stats)
+
+    start = time.perf_counter()
+    parse_time = stats.parse_time
+    paused = 0.0
+    try:
+        for chunk in _stream_chunks(kwargs, count, stats):
+            for part in processor.feed(chunk):
+                pause_start = time.perf_counter()
+                yield part
+                paused += time.perf_counter() - pause_start
+    finally:
+        elapsed = time.perf_counter() - start - paused
+        stats.llm_latency += elapsed - (stats.parse_time - parse_time)
+
+    # Ask only for the questions missing in a truncated or partially invalid stream
+    streamed = GenerateQuestionSetResponse(title="", description="", questions=processor.questions)
+    response = _complete_missing(prompt, count, streamed, None, stats)
+    for question in response.questions[len(streamed.questions) :]:
+        yield "question", question
+
+
+async def astream_questions(
+    prompt: str, count: int, stats: GenerationStats | None = None
+) -> AsyncIterator[tuple[str, Any]]:
+    """Async version of `stream_questions`."""
+
+    stats = stats if stats is not None else GenerationStats()
+    kwargs = _completion_kwargs(prompt, count, stream=True)
+    processor = _StreamProcessor(count, stats)
+
+    start = time.perf_counter()
+    parse_time = stats.parse_time
+    paused = 0.0
+    try:
+        async for chunk in _astream_chunks(kwargs, count, stats):
+            for part in processor.feed(chunk):
+                pause_start = time.perf_counter()
+                yield part
+                paused += time.perf_counter() - pause_start
+    finally:
+        elapsed = time.perf_counter() - start - paused
+        stats.llm_latency += elapsed - (stats.parse_time - parse_time)
+
+    streamed = GenerateQuestionSetResponse(title="", description="", questions=processor.questions)
+    response = await _acomplete_missing(prompt, count, streamed, None, stats)
+    for question in response.questions[len(streamed.questions) :]:
+        yield "question", question
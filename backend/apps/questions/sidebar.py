@@ -0,0 +1,30 @@
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from .models import QuestionSet
+
+# Sets shown in the sidebar before "load more"
+PAGE_SIZE = 30
+# Time the rendered sidebar of a user is kept in the cache
+CACHE_TTL = 60 * 60 * 24  # Seconds
+FRAGMENT_NAME = "sidebar_question_sets"
+
+
+def get_page(user_id: str, offset: int = 0) -> dict:
+    """Sets of the sidebar after `offset`, with only the columns it shows."""
+
+    question_sets = list(
+        QuestionSet.objects.filter(user_id=user_id)
+        .order_by("-pinned_at", "-id")
+        .only("id", "title", "pinned_at")[offset : offset + PAGE_SIZE + 1]
+    )
+    return {
+        "question_sets": question_sets[:PAGE_SIZE],
+        "next_offset": offset + PAGE_SIZE if len(question_sets) > PAGE_SIZE else None,
+    }
+
+
+def invalidate(user_id: str) -> None:
+    """Drop the cached sidebar of the user, after a set is created, renamed, pinned or deleted."""
+
+    cache.delete(make_template_fragment_key(FRAGMENT_NAME, [user_id]))
@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.dashboard import stats
+
+from . import events, scheduler, sidebar
+from .models import Choice, Question, QuestionSet
+from .tasks import start_queued_generations
+
+
+@receiver(post_save, sender=QuestionSet)
+def question_set_finished(sender, instance: QuestionSet, update_fields=None, **kwargs):
+    """Notify the pages of a finished set, add its questions to the user stats,
+    free its generation job and start the next queued ones.
+    """
+
+    if update_fields is not None and "status" not in update_fields:
+        return
+    if instance.status == "pending":
+        return
+
+    questions_count = instance.questions.count()
+    events.publish(instance.id, instance.status, questions_count)
+    # Once per generation, the generations save only the status when they finish.
+    # The questions kept by a failed generation are counted too.
+    if update_fields is not None:
+        stats.add(instance.user_id, questions_count=questions_count)  # pyright: ignore[reportAttributeAccessIssue]
+    if scheduler.complete(instance.id):
+        start_queued_generations()
+
+
+# Fields of a set shown in the sidebar
+SIDEBAR_FIELDS = {"title", "pinned_at"}
+
+
+@receiver(post_save, sender=QuestionSet)
+def question_set_saved(sender, instance: QuestionSet, created=False, update_fields=None, **kwargs):
+    if created or update_fields is None or SIDEBAR_FIELDS & set(update_fields):
+        user_id = instance.user_id  # pyright: ignore[reportAttributeAccessIssue]
+        transaction.on_commit(lambda: sidebar.invalidate(user_id))
+
+
+@receiver(post_delete, sender=QuestionSet)
+def question_set_deleted(sender, instance: QuestionSet, **kwargs):
+    user_id = instance.user_id  # pyright: ignore[reportAttributeAccessIssue]
+    transaction.on_commit(lambda: sidebar.invalidate(user_id))
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance: Question, **kwargs):
+    """Invalidate the cached question grid of the set. Bulk inserts don't send signals,
+    but the grid is only cached after the generation finishes.
+    Deletes are handled by the admin, a delete receiver would load every question and
+    choice of a set to delete it.
+    """
+
+    QuestionSet.bump_cache_version(instance.question_set_id)  # pyright: ignore[reportAttributeAccessIssue]
+
+
+@receiver(post_save, sender=Choice)
+def choice_saved(sender, instance: Choice, **kwargs):
+    question_set_id = (
+        Question.objects.filter(id=instance.question_id)  # pyright: ignore[reportAttributeAccessIssue]
+        .values_list("question_set_id", flat=True)
+        .first()
+    )
+    if question_set_id:
+        QuestionSet.bump_cache_version(question_set_id)
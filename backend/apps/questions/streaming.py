@@ -0,0 +1,92 @@
+import json
+import logging
+from collections.abc import Iterator
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+
+class QuestionStreamParser:
+    """Incremental parser for the JSON reply of the question generation.
+
+    The reply is fed in chunks as it arrives from the model. The top-level
+    `title` and `description` values and each object of the `questions` array
+    are emitted as soon as they are complete, without waiting for the rest of
+    the document.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key: str | None = None
+        self._string_start: int | None = None
+        self._object_start: int | None = None
+
+    @staticmethod
+    def _loads(raw: str) -> Any:
+        """Decode a complete value, or None if the model wrote invalid JSON."""
+
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            log.warning(f"Skipping invalid JSON value in the reply: {e}")
+            return None
+
+    def feed(self, chunk: str) -> Iterator[tuple[str, Any]]:
+        """Consume a chunk of text and yield `(key, value)` pairs.
+
+        `key` is "title", "description" or "question" (a raw dict that still
+        needs to be validated).
+        """
+        self.text += chunk
+        text = self.text
+
+        while self._pos < len(text):
+            i = self._pos
+            char = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        value = self._loads(text[self._string_start : i + 1])
+                        self._string_start = None
+                        if self._expect_key:
+                            self._key = value
+                        elif self._key in ("title", "description") and value is not None:
+                            yield self._key, value
+                continue
+
+            if char == '"':
+                self._in_string = True
+                # Only top-level strings (keys and values) are relevant
+                if self._depth == 1:
+                    self._string_start = i
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = True
+                elif self._depth == 3 and char == "{" and self._key == "questions":
+                    self._object_start = i
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._object_start is not None:
+                    value = self._loads(text[self._object_start : i + 1])
+                    self._object_start = None
+                    # Only the broken question is skipped, the next ones may be fine
+                    if value is not None:
+                        yield "question", value
+            elif self._depth == 1:
+                if char == ":":
+                    self._expect_key = False
+                elif char == ",":
+                    self._expect_key = True
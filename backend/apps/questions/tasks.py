@@ -1,45 +1,240 @@
 import logging
 
-from celery import shared_task
+from celery import chord, shared_task
 from django.conf import settings
-from django.db import transaction
+from django.db import connection
 
-from .models import Choice, Question, QuestionSet
-from .service import generate_questions
+from apps.common.db import WriteQueryTimer
+
+from . import cache as generation_cache
+from . import events, executor, practice_state, scheduler, telemetry
+from .models import QuestionSet
+from .persistence import save_questions, save_response
+from .service import (
+    GenerateQuestionSetResponse,
+    GenerationStats,
+    generate_questions,
+    merge_responses,
+    split_shards,
+    stream_questions,
+)
 
 log = logging.getLogger(__name__)
 
 
-@shared_task(max_retries=0)
-def generate_questions_task(question_set_id: int, prompt: str, questions_number: int) -> None:
-    log.info(f"Generate questions task started for question set {question_set_id}")
+def _generate(
+    question_set: QuestionSet, prompt: str, questions_number: int, stats: GenerationStats
+) -> GenerateQuestionSetResponse:
+    response = generate_questions(prompt, questions_number, stats=stats)
+    save_response(question_set, response, stats.model)
+    return response
+
+
+def _generate_streaming(
+    question_set: QuestionSet, prompt: str, questions_number: int, stats: GenerationStats
+) -> GenerateQuestionSetResponse | None:
+    """Save each question as soon as it arrives from the stream.
+    If the stream breaks, the questions already saved are kept.
+    Returns the complete response, or None if the stream broke.
+    """
+
+    questions = []
+    try:
+        for key, value in stream_questions(prompt, questions_number, stats):
+            # The backend that serves the stream is known after it starts
+            if question_set.model != stats.model:
+                question_set.model = stats.model
+                question_set.save(update_fields=["model"])
+            if key == "question":
+                save_questions(question_set, [value])
+                questions.append(value)
+                events.publish(question_set.id, "pending", len(questions))
+            else:
+                setattr(question_set, key, value)
+                question_set.save(update_fields=[key])
+    except Exception as e:
+        if not questions:
+            raise
+        log.exception(
+            f"Stream broke for question set {question_set.id} after {len(questions)} questions: {e}"
+        )
+        return None
+
+    if not questions:
+        raise ValueError("The stream finished without any valid question")
+
+    return GenerateQuestionSetResponse(
+        title=question_set.title,
+        description=question_set.description or "",
+        questions=questions,
+    )
+
+
+def _generate_question_set(
+    question_set_id: int,
+    prompt: str,
+    questions_number: int,
+    stats: GenerationStats,
+    queue_wait: float | None,
+) -> str | None:
+    """Generate the questions of the set, adding the usage and timings to `stats`.
+    Returns the id of the merge task if the set is generated in shards.
+    """
 
     question_set = QuestionSet.objects.get(id=question_set_id)
+    cache_entry_id = None
 
     try:
-        response = generate_questions(prompt, questions_number)
-        question_set.title = response.title
-        question_set.description = response.description
-        question_set.model = settings.AI_SERVICE_MODEL
-        question_set.save(update_fields=["title", "description", "model"])
-
-        with transaction.atomic():
-            for question in response.questions:
-                _question = Question.objects.create(
-                    question_set=question_set,
-                    text=question.text,
-                    type="multiple_choice",
-                    explanation=question.explanation,
+        if settings.GENERATION_CACHE_ENABLED:
+            cached, cache_entry_id = generation_cache.acquire(prompt, questions_number)
+            if cached is not None:
+                log.info(f"Generation cache hit for question set {question_set_id}")
+                stats.cached = True
+                save_response(question_set, cached)
+                question_set.status = "success"
+                question_set.save(update_fields=["status"])
+                return None
+
+        # Large sets are generated in parallel shards.
+        # The status is set by the merge task once all shards finish.
+        if questions_number > settings.AI_SERVICE_SHARD_SIZE:
+            shards = split_shards(questions_number, settings.AI_SERVICE_SHARD_SIZE)
+            result = chord(
+                generate_questions_shard_task.s(prompt, count, index, len(shards))
+                for index, count in enumerate(shards)
+            )(
+                merge_question_shards_task.s(
+                    question_set_id, cache_entry_id, questions_number, queue_wait
                 )
-                for choice in question.choices:
-                    Choice.objects.create(
-                        question=_question,
-                        text=choice.text,
-                        is_correct=choice.is_correct,
-                    )
+            )
+            return result.id
+
+        if settings.AI_SERVICE_STREAM:
+            response = _generate_streaming(question_set, prompt, questions_number, stats)
+        else:
+            response = _generate(question_set, prompt, questions_number, stats)
+        generation_cache.finish(cache_entry_id, response, stats.model)
         question_set.status = "success"
     except Exception as e:
         log.exception(f"Error generating questions for {question_set_id}: {e}")
+        generation_cache.finish(cache_entry_id, None)
         question_set.status = "error"
 
     question_set.save(update_fields=["status"])
+    return None
+
+
+@shared_task(max_retries=0)
+def generate_questions_task(question_set_id: int, prompt: str, questions_number: int) -> dict:
+    log.info(f"Generate questions task started for question set {question_set_id}")
+
+    stats = GenerationStats()
+    queue_wait = telemetry.queue_wait(question_set_id)
+    timer = WriteQueryTimer()
+    with connection.execute_wrapper(timer):
+        merge_task_id = _generate_question_set(
+            question_set_id, prompt, questions_number, stats, queue_wait
+        )
+
+    # The merge task records the telemetry of the sets generated in shards
+    if merge_task_id is None:
+        telemetry.record(question_set_id, questions_number, stats, queue_wait, timer.elapsed)
+
+    return {"db_write_time": timer.elapsed, "merge_task_id": merge_task_id}
+
+
+def dispatch_generation(question_set_id: str, prompt: str, questions_number: int) -> None:
+    """Send the generation to the executor configured in AI_SERVICE_EXECUTOR."""
+
+    if settings.AI_SERVICE_EXECUTOR == "async":
+        executor.submit(question_set_id, prompt, questions_number)
+    else:
+        generate_questions_task.delay(question_set_id, prompt, questions_number)
+
+
+def start_queued_generations() -> None:
+    """Dispatch the queued jobs picked by the scheduler."""
+
+    try:
+        jobs = scheduler.drain()
+    except Exception as e:
+        # The periodic drain starts them later
+        log.exception(f"Error draining the generation queue: {e}")
+        return
+
+    for job in jobs:
+        question_set = job.question_set
+        dispatch_generation(question_set.id, question_set.prompt, job.questions_number)  # pyright: ignore[reportOptionalMemberAccess]
+
+
+@shared_task(max_retries=0)
+def drain_generation_queue_task() -> None:
+    start_queued_generations()
+
+
+@shared_task(max_retries=0)
+def flush_practice_states_task() -> None:
+    flushed = practice_state.flush_due()
+    if flushed:
+        log.info(f"Flushed the state of {flushed} practice sessions")
+
+
+@shared_task(max_retries=0)
+def generate_questions_shard_task(
+    prompt: str, questions_number: int, shard_index: int, shards: int
+) -> dict | None:
+    # Never raise, a failed shard would prevent the merge task from running
+    try:
+        stats = GenerationStats()
+        response = generate_questions(prompt, questions_number, (shard_index, shards), stats)
+        return {"response": response.model_dump(), "stats": stats.model_dump()}
+    except Exception as e:
+        log.exception(f"Error generating questions shard {shard_index + 1}/{shards}: {e}")
+        return None
+
+
+def _merge_question_shards(
+    results: list[dict | None], question_set_id: int, cache_entry_id: str | None, model: str
+) -> None:
+    question_set = QuestionSet.objects.get(id=question_set_id)
+
+    try:
+        responses = [
+            GenerateQuestionSetResponse(**result["response"]) for result in results if result
+        ]
+        if not responses:
+            raise ValueError("All the shards failed")
+
+        response = merge_responses(responses)
+        save_response(question_set, response, model)
+        # Only cache the set if all the shards succeeded
+        generation_cache.finish(cache_entry_id, response if all(results) else None, model)
+        question_set.status = "success"
+    except Exception as e:
+        log.exception(f"Error merging questions shards for {question_set_id}: {e}")
+        generation_cache.finish(cache_entry_id, None)
+        question_set.status = "error"
+
+    question_set.save(update_fields=["status"])
+
+
+@shared_task(max_retries=0)
+def merge_question_shards_task(
+    results: list[dict | None],
+    question_set_id: int,
+    cache_entry_id: str | None = None,
+    questions_number: int = 0,
+    queue_wait: float | None = None,
+) -> dict:
+    log.info(f"Merging {len(results)} shards for question set {question_set_id}")
+
+    stats = GenerationStats()
+    stats.merge([GenerationStats(**result["stats"]) for result in results if result])
+
+    timer = WriteQueryTimer()
+    with connection.execute_wrapper(timer):
+        _merge_question_shards(results, question_set_id, cache_entry_id, stats.model)
+
+    telemetry.record(question_set_id, questions_number, stats, queue_wait, timer.elapsed)
+
+    return {"db_write_time": timer.elapsed}
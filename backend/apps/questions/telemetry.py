@@ -0,0 +1,124 @@
+import logging
+import statistics
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, QuerySet, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import GenerationJob, GenerationTelemetry, QuestionSet
+from .service import GenerationStats
+
+log = logging.getLogger(__name__)
+
+# Timings summarized in the admin, in seconds
+TIMINGS = [
+    ("queue_wait", "Espera na fila"),
+    ("llm_latency", "Latência do LLM"),
+    ("parse_time", "Validação"),
+    ("db_write_time", "Escrita no banco"),
+]
+# Max generations used in the percentiles
+SUMMARY_LIMIT = 10000
+
+
+def queue_wait(question_set_id: str) -> float | None:
+    """Seconds since the set was queued by the scheduler, called when the generation starts."""
+
+    queued_at = (
+        GenerationJob.objects.filter(question_set_id=question_set_id)
+        .values_list("queued_at", flat=True)
+        .first()
+    )
+    return (timezone.now() - queued_at).total_seconds() if queued_at else None
+
+
+def cost(model: str, prompt_tokens: int, completion_tokens: int) -> Decimal:
+    """Cost in USD from the prices per million tokens in AI_SERVICE_PRICING."""
+
+    prices = settings.AI_SERVICE_PRICING.get(model)
+    if not prices:
+        return Decimal(0)
+
+    total = Decimal(str(prices["input"])) * prompt_tokens
+    total += Decimal(str(prices["output"])) * completion_tokens
+    return total / 1_000_000
+
+
+def record(
+    question_set_id: str,
+    questions_number: int,
+    stats: GenerationStats,
+    queue_wait: float | None,
+    db_write_time: float,
+) -> None:
+    """Save the telemetry of a finished generation. Never raises."""
+
+    try:
+        question_set = QuestionSet.objects.get(id=question_set_id)
+        model = stats.model or question_set.model or settings.AI_SERVICE_MODEL
+        GenerationTelemetry.objects.create(
+            question_set=question_set,
+            model=model,
+            status="success" if question_set.status == "success" else "error",
+            cached=stats.cached,
+            questions_number=questions_number,
+            questions_count=question_set.questions.count(),
+            prompt_tokens=stats.prompt_tokens,
+            completion_tokens=stats.completion_tokens,
+            queue_wait=queue_wait,
+            llm_latency=stats.llm_latency,
+            parse_time=stats.parse_time,
+            db_write_time=db_write_time,
+            cost=cost(model, stats.prompt_tokens, stats.completion_tokens),
+            finished_at=timezone.now(),
+        )
+    except Exception as e:
+        log.exception(f"Error recording the telemetry of question set {question_set_id}: {e}")
+
+
+def percentile(values: list[float], percent: int) -> float:
+    """Percentile of the sorted `values`."""
+
+    if len(values) < 2:
+        return values[0] if values else 0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def summarize(queryset: QuerySet[GenerationTelemetry]) -> dict:
+    """Aggregates of the generations, to spot regressions and size the capacity.
+    The timings of the cached generations are ignored.
+    """
+
+    recent = queryset.filter(cached=False).order_by("-finished_at")[:SUMMARY_LIMIT]
+    rows = list(recent.values_list(*(field for field, _ in TIMINGS)))
+    timings = []
+    for index, (field, label) in enumerate(TIMINGS):
+        values = sorted(row[index] for row in rows if row[index] is not None)
+        timings.append(
+            {"label": label, "p50": percentile(values, 50), "p95": percentile(values, 95)}
+        )
+
+    totals = queryset.aggregate(
+        generations=Count("id"),
+        prompt_tokens=Sum("prompt_tokens", default=0),
+        completion_tokens=Sum("completion_tokens", default=0),
+        questions=Sum("questions_count", default=0),
+        cost=Sum("cost", default=0),
+    )
+    tokens = totals["prompt_tokens"] + totals["completion_tokens"]
+    totals["tokens_per_question"] = tokens / totals["questions"] if totals["questions"] else 0
+
+    daily = (
+        queryset.annotate(date=TruncDate("finished_at"))
+        .values("date", "model")
+        .annotate(
+            generations=Count("id"),
+            tokens=Sum(F("prompt_tokens") + F("completion_tokens")),
+            cost=Sum("cost"),
+        )
+        .order_by("-date", "model")[:60]
+    )
+
+    return {"timings": timings, "totals": totals, "daily": list(daily)}
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from unittest import mock
+
+import fakeredis
+from django.test import TestCase, override_settings
+
+from apps.accounts.models import User
+from apps.dashboard.models import DailyActivity, UserStats
+from apps.questions import practice_state
+from apps.questions.models import Choice, PracticeSession, Question, QuestionSet
+
+
+@override_settings(PRACTICE_STATE_IDLE_TIMEOUT=60, PRACTICE_STATE_FLUSH_INTERVAL=300)
+class PracticeStateTests(TestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        for name, redis in [
+            ("get_redis", lambda: fakeredis.FakeRedis(server=server)),
+            ("get_async_redis", lambda: fakeredis.FakeAsyncRedis(server=server)),
+        ]:
+            patcher = mock.patch.object(practice_state, name, redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user("a@example.com", "pw", first_name="A")
+        question_set = QuestionSet.objects.create(
+            user=user, title="T", prompt="P", status="pending"
+        )
+        self.questions = []
+        for i in range(3):
+            question = Question.objects.create(
+                question_set=question_set, text=f"Q{i}", type="multiple_choice", explanation="E"
+            )
+            for j in range(4):
+                Choice.objects.create(question=question, text=f"C{j}", is_correct=j == 0)
+            self.questions.append(question)
+        self.session = PracticeSession.objects.create(
+            question_set=question_set, questions_order=[q.id for q in self.questions]
+        )
+
+    def _choice(self, index: int, correct: bool = True) -> str:
+        return self.questions[index].choices.filter(is_correct=correct).first().id  # pyright: ignore[reportOptionalMemberAccess]
+
+    def _update(self, answers: dict[str, str], current_index: int = 0) -> None:
+        asyncio.run(practice_state.aupdate(self.session.id, answers, current_index))
+
+    def _answer_all(self) -> None:
+        self._update({q.id: self._choice(i, i != 2) for i, q in enumerate(self.questions)}, 2)
+
+    def test_load_merges_the_state_with_the_last_flush(self):
+        self.session.save_answers({self.questions[0].id: self._choice(0, False)})
+        self._update({self.questions[1].id: self._choice(1)}, 1)
+        self._update({self.questions[0].id: self._choice(0)}, 1)
+
+        answers, current_index = practice_state.load(self.session)
+        self.assertEqual(
+            answers,
+            {self.questions[0].id: self._choice(0), self.questions[1].id: self._choice(1)},
+        )
+        self.assertEqual(current_index, 1)
+
+    def test_flush_writes_the_state_and_drops_it(self):
+        self._update({self.questions[0].id: self._choice(0)}, 1)
+        practice_state.flush(self.session)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.current_index, 1)
+        self.assertEqual(self.session.answers.get().choice_id, self._choice(0))
+        self.assertIsNone(practice_state.get(self.session.id))
+        # Nothing left to flush
+        practice_state.flush(self.session)
+
+    def test_flush_keeps_changes_made_meanwhile(self):
+        self._update({self.questions[0].id: self._choice(0)})
+        save_answers = self.session.save_answers
+
+        def save_and_change(answers):
+            save_answers(answers)
+            self._update({self.questions[1].id: self._choice(1)}, 1)
+
+        with mock.patch.object(self.session, "save_answers", side_effect=save_and_change):
+            practice_state.flush(self.session)
+
+        state = practice_state.get(self.session.id)
+        self.assertIsNotNone(state)
+        self.assertIn(self.questions[1].id, state["answers"])  # pyright: ignore[reportOptionalSubscript]
+        practice_state.flush(self.session)
+        self.assertEqual(self.session.answers.count(), 2)
+
+    def test_finish_returns_the_first_unanswered_question(self):
+        self._update({self.questions[0].id: self._choice(0)})
+        self.assertEqual(practice_state.finish(self.session), 1)
+        self.assertIsNone(PracticeSession.objects.get(id=self.session.id).finished_at)
+
+    def test_finish_counts_the_session_once(self):
+        self._answer_all()
+        # Two requests finishing the same session
+        first = PracticeSession.objects.select_related("question_set").get(id=self.session.id)
+        second = PracticeSession.objects.select_related("question_set").get(id=self.session.id)
+        self.assertIsNone(practice_state.finish(first))
+        self.assertIsNone(practice_state.finish(second))
+
+        session = PracticeSession.objects.get(id=self.session.id)
+        self.assertEqual(session.correct_count, 2)
+        self.assertIsNone(practice_state.get(session.id))
+
+        stats = UserStats.objects.get()
+        self.assertEqual((stats.answered_count, stats.correct_count), (3, 2))
+        self.assertEqual(sum(DailyActivity.objects.values_list("practices_count", flat=True)), 1)
+        self.assertEqual(
+            sorted(Question.objects.values_list("answers_count", "correct_count")),
+            [(1, 0), (1, 1), (1, 1)],
+        )
+        self.assertEqual(sum(Choice.objects.values_list("picks_count", flat=True)), 3)
+
+    def test_flush_due(self):
+        self._update({self.questions[0].id: self._choice(0)})
+        self.assertEqual(practice_state.flush_due(), 0)
+
+        # Idle for longer than PRACTICE_STATE_IDLE_TIMEOUT
+        with mock.patch.object(practice_state.time, "time", return_value=time.time() + 61):
+            self.assertEqual(practice_state.flush_due(), 1)
+        self.assertIsNone(practice_state.get(self.session.id))
+        self.assertEqual(self.session.answers.count(), 1)
+
+    def test_flush_due_discards_finished_sessions(self):
+        self._update({self.questions[0].id: self._choice(0)})
+        PracticeSession.objects.filter(id=self.session.id).update(finished_at="2026-01-01T00:00Z")
+
+        with mock.patch.object(practice_state.time, "time", return_value=time.time() + 61):
+            self.assertEqual(practice_state.flush_due(), 0)
+        self.assertIsNone(practice_state.get(self.session.id))
+        self.assertEqual(self.session.answers.count(), 0)
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.questions.router import MIN_SAMPLES, Backend, Router
+
+
+def _backend(name: str) -> Backend:
+    return Backend(name, "http://localhost:1/v1", "key", f"{name}-model")
+
+
+@override_settings(AI_SERVICE_BREAKER_FAILURES=3, AI_SERVICE_BREAKER_COOLDOWN=30)
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures(self):
+        backend = _backend("a")
+        backend.record_failure()
+        backend.record_failure()
+        self.assertFalse(backend.is_open)
+        backend.record_failure()
+        self.assertTrue(backend.is_open)
+
+    def test_success_resets_the_failures(self):
+        backend = _backend("a")
+        backend.record_failure()
+        backend.record_failure()
+        backend.record_success(1, 1)
+        backend.record_failure()
+        self.assertFalse(backend.is_open)
+
+    def test_lets_a_trial_request_through_after_the_cooldown(self):
+        backend = _backend("a")
+        with mock.patch("apps.questions.router.time.monotonic", return_value=100):
+            for _ in range(3):
+                backend.record_failure()
+        with mock.patch("apps.questions.router.time.monotonic", return_value=129):
+            self.assertTrue(backend.is_open)
+        with mock.patch("apps.questions.router.time.monotonic", return_value=131):
+            self.assertFalse(backend.is_open)
+            # The trial request failed, open again
+            backend.record_failure()
+            self.assertTrue(backend.is_open)
+
+    def test_ranked_skips_open_backends(self):
+        a, b = _backend("a"), _backend("b")
+        for _ in range(3):
+            a.record_failure()
+        router = Router([a, b])
+        self.assertEqual(router.ranked(), [b])
+
+        # All open, try them anyway
+        for _ in range(3):
+            b.record_failure()
+        self.assertCountEqual(router.ranked(), [a, b])
+
+    def test_ranked_by_latency(self):
+        fast, slow = _backend("fast"), _backend("slow")
+        for _ in range(MIN_SAMPLES):
+            fast.record_success(1, 10)
+            slow.record_success(5, 10)
+        self.assertEqual(Router([slow, fast]).ranked(), [fast, slow])
+
+
+@override_settings(AI_SERVICE_BREAKER_FAILURES=3, AI_SERVICE_HEDGING=True)
+class RouterCallTests(SimpleTestCase):
+    def test_call_fails_over_to_the_next_backend(self):
+        a, b = _backend("a"), _backend("b")
+
+        def func(backend):
+            if backend is a:
+                raise RuntimeError("down")
+            return "ok"
+
+        self.assertEqual(Router([a, b]).call(func, 1), (b, "ok"))
+        self.assertEqual(a.error_rate, 1)
+        self.assertEqual(b.error_rate, 0)
+
+    def test_call_raises_the_last_error(self):
+        def func(backend):
+            raise RuntimeError(backend.name)
+
+        with self.assertRaisesMessage(RuntimeError, "b"):
+            Router([_backend("a"), _backend("b")]).call(func, 1)
+
+    def test_call_does_not_hedge(self):
+        slow, fast = _backend("slow"), _backend("fast")
+        # Ranked first, with a lower median latency
+        for _ in range(MIN_SAMPLES):
+            slow.record_success(0.001, 1)
+            fast.record_success(0.002, 1)
+        called = []
+
+        def func(backend):
+            called.append(backend)
+            # Slower than the p95 latency
+            time.sleep(0.05)
+            return backend.name
+
+        self.assertEqual(Router([slow, fast]).call(func, 1), (slow, "slow"))
+        self.assertEqual(called, [slow])
+
+    def test_acall_hedges_and_cancels_the_slow_request(self):
+        slow, fast = _backend("slow"), _backend("fast")
+        # Ranked first, with a lower median latency
+        for _ in range(MIN_SAMPLES):
+            slow.record_success(0.01, 1)
+            fast.record_success(0.02, 1)
+        cancelled = []
+
+        async def func(backend):
+            if backend is slow:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(backend)
+                    raise
+            return backend.name
+
+        async def main():
+            result = await Router([slow, fast]).acall(func, 1)
+            # Let the cancellation run
+            await asyncio.sleep(0)
+            return result
+
+        self.assertEqual(asyncio.run(main()), (fast, "fast"))
+        self.assertEqual(cancelled, [slow])
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from unittest import mock
+
+import fakeredis
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.questions import scheduler
+from apps.questions.models import GenerationJob, QuestionSet
+
+
+@override_settings(
+    GENERATION_MAX_RUNNING=3, GENERATION_USER_CONCURRENCY=2, GENERATION_JOB_TIMEOUT=60
+)
+class SchedulerTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(scheduler, "get_redis", return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _user(self, name: str) -> User:
+        return User.objects.create_user(f"{name}@example.com", "pw", first_name=name)
+
+    def _enqueue(self, *users: User) -> list[QuestionSet]:
+        """Queue a set of each user, in this order."""
+
+        question_sets = [
+            QuestionSet.objects.create(user=user, title="T", prompt="P", status="pending")
+            for user in users
+        ]
+        scheduler.enqueue_many(question_sets, [5] * len(question_sets))
+        return question_sets
+
+    def _started(self, jobs: list[GenerationJob]) -> list[str]:
+        return [job.question_set_id for job in jobs]  # pyright: ignore[reportAttributeAccessIssue]
+
+    def test_drain_takes_turns_between_users(self):
+        a, b, c = self._user("a"), self._user("b"), self._user("c")
+        a1, a2, a3, b1, c1 = self._enqueue(a, a, a, b, c)
+
+        self.assertEqual(self._started(scheduler.drain()), [a1.id, b1.id, c1.id])
+        self.assertEqual(scheduler.drain(), [])
+
+        scheduler.complete(b1.id)
+        scheduler.complete(c1.id)
+        # The second job of the user, the third waits for the user concurrency
+        self.assertEqual(self._started(scheduler.drain()), [a2.id])
+        self.assertEqual(GenerationJob.objects.get(question_set=a3).status, "queued")
+
+    def test_drain_starts_the_lanes_that_waited_longest(self):
+        a, b = self._user("a"), self._user("b")
+        a1, a2, a3, b1, b2 = self._enqueue(a, a, a, b, b)
+        self.assertEqual(self._started(scheduler.drain()), [a1.id, b1.id, a2.id])
+
+        # b started its last job before a, its next job goes first
+        GenerationJob.objects.filter(question_set=b1).update(
+            started_at=timezone.now() - timedelta(seconds=10)
+        )
+        scheduler.complete(a1.id)
+        self.assertEqual(self._started(scheduler.drain()), [b2.id])
+
+    def test_drain_frees_deleted_and_finished_sets(self):
+        a = self._user("a")
+        a1, a2, a3 = self._enqueue(a, a, a)
+        scheduler.drain()
+
+        a1.delete()
+        QuestionSet.objects.filter(id=a2.id).update(status="success")
+        self.assertEqual(self._started(scheduler.drain()), [a3.id])
+
+    def test_drain_releases_lost_jobs(self):
+        a = self._user("a")
+        a1, a2, a3 = self._enqueue(a, a, a)
+        scheduler.drain()
+
+        GenerationJob.objects.filter(question_set=a1).update(
+            started_at=timezone.now() - timedelta(seconds=61)
+        )
+        self.assertEqual(self._started(scheduler.drain()), [a3.id])
+        a1.refresh_from_db()
+        self.assertEqual(a1.status, "error")
+
+    def test_queue_position_follows_the_turns(self):
+        a, b, c = self._user("a"), self._user("b"), self._user("c")
+        a1, a2, a3, b1, c1 = self._enqueue(a, a, a, b, c)
+
+        positions = [scheduler.queue_position(s.id) for s in (a1, b1, c1, a2, a3)]
+        self.assertEqual(positions, [1, 2, 3, 4, 5])
+
+        started = scheduler.drain()
+        self.assertIsNone(scheduler.queue_position(started[0].question_set_id))  # pyright: ignore[reportAttributeAccessIssue]
+        self.assertEqual(scheduler.queue_position(a2.id), 1)
+        self.assertEqual(scheduler.queue_position(a3.id), 2)
@@ -0,0 +1,136 @@
+import json
+import types
+from collections import Counter
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.questions import service
+from apps.questions.service import (
+    QUESTION_CHOICES,
+    GenerateQuestionSetResponse,
+    GenerationStats,
+    Question,
+    _parse_response,
+    _salvage_response,
+    _strict_schema,
+    generate_questions,
+    merge_responses,
+    split_shards,
+)
+
+
+def _question(text: str) -> dict:
+    return {
+        "text": text,
+        "choices": [{"text": f"{text} {i}", "is_correct": i == 0} for i in range(QUESTION_CHOICES)],
+        "explanation": f"Explicação de {text}",
+    }
+
+
+# A reply with a broken question object next to a valid one
+MALFORMED_REPLY = (
+    '{"title": "T", "description": "D", "questions": [{"text": "x",}, '
+    + json.dumps(_question("Q2"))
+    + "]}"
+)
+
+
+class SalvageTests(SimpleTestCase):
+    def test_salvage_keeps_the_valid_questions(self):
+        response = _salvage_response(MALFORMED_REPLY)
+        self.assertEqual(response.title, "T")
+        self.assertEqual([q.text for q in response.questions], ["Q2"])
+
+    def test_salvage_truncated_reply(self):
+        reply = '{"title": "T", "questions": [' + json.dumps(_question("Q1")) + ', {"text": "Q'
+        response = _salvage_response(reply)
+        self.assertEqual(response.description, "")
+        self.assertEqual([q.text for q in response.questions], ["Q1"])
+
+    def test_parse_response_drops_invalid_questions(self):
+        no_correct = _question("Q2")
+        no_correct["choices"][0]["is_correct"] = False
+        reply = json.dumps(
+            {"title": "T", "description": "D", "questions": [_question("Q1"), no_correct]}
+        )
+        response = _parse_response(reply, GenerationStats())
+        self.assertEqual([q.text for q in response.questions], ["Q1"])
+
+    def test_parse_response_salvages_malformed_json(self):
+        response = _parse_response(MALFORMED_REPLY, GenerationStats())
+        self.assertEqual([q.text for q in response.questions], ["Q2"])
+
+
+@override_settings(AI_SERVICE_REPAIR_ATTEMPTS=1)
+class GenerateQuestionsTests(SimpleTestCase):
+    def _reply(self, content: str):
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+    def test_asks_again_only_for_the_missing_questions(self):
+        replies = [
+            self._reply(MALFORMED_REPLY),
+            self._reply(
+                json.dumps({"title": "", "description": "", "questions": [_question("Q3")]})
+            ),
+        ]
+        counts = []
+
+        def call(create, count):
+            counts.append(count)
+            return types.SimpleNamespace(model="m"), (replies.pop(0), 0.1)
+
+        with mock.patch.object(service.router, "call", side_effect=call):
+            response = generate_questions("prompt", 2)
+
+        self.assertEqual(counts, [2, 1])
+        self.assertEqual(response.title, "T")
+        self.assertEqual(sorted(q.text for q in response.questions), ["Q2", "Q3"])
+
+
+class StrictSchemaTests(SimpleTestCase):
+    def test_objects_require_all_properties(self):
+        schema = _strict_schema(GenerateQuestionSetResponse.model_json_schema())
+
+        objects = [schema, *schema["$defs"].values()]
+        self.assertEqual(len(objects), 3)
+        for obj in objects:
+            self.assertIs(obj["additionalProperties"], False)
+            self.assertEqual(obj["required"], list(obj["properties"]))
+
+
+class ShardingTests(SimpleTestCase):
+    def test_split_shards(self):
+        self.assertEqual(split_shards(25, 10), [9, 8, 8])
+        self.assertEqual(split_shards(20, 10), [10, 10])
+        self.assertEqual(split_shards(5, 10), [5])
+        for number in range(1, 100):
+            shards = split_shards(number, 7)
+            self.assertEqual(sum(shards), number)
+            self.assertLessEqual(max(shards) - min(shards), 1)
+            self.assertLessEqual(max(shards), 7)
+
+    def test_merge_responses(self):
+        def response(title, *texts):
+            return GenerateQuestionSetResponse(
+                title=title,
+                description=f"{title} D",
+                questions=[Question(**_question(text)) for text in texts],
+            )
+
+        questions = [f"Questão {i}" for i in range(8)]
+        merged = merge_responses(
+            [
+                response("A", *questions[:4]),
+                # Same question, with other case and punctuation
+                response("B", "questão 0!", *questions[4:]),
+            ]
+        )
+
+        self.assertEqual((merged.title, merged.description), ("A", "A D"))
+        self.assertEqual([q.text for q in merged.questions], questions)
+        indexes = Counter(
+            next(i for i, c in enumerate(q.choices) if c.is_correct) for q in merged.questions
+        )
+        self.assertEqual(indexes, {i: 2 for i in range(QUESTION_CHOICES)})
@@ -0,0 +1,114 @@
+import json
+import types
+from collections import Counter
+
+from django.test import SimpleTestCase
+
+from apps.questions.service import (
+    QUESTION_CHOICES,
+    GenerationStats,
+    Question,
+    _ChoiceBalancer,
+    _StreamProcessor,
+)
+from apps.questions.streaming import QuestionStreamParser
+
+
+def _question(text: str, correct: int = 0) -> dict:
+    return {
+        "text": text,
+        "choices": [
+            {"text": f"{text} {i}", "is_correct": i == correct} for i in range(QUESTION_CHOICES)
+        ],
+        "explanation": f"Explicação de {text}",
+    }
+
+
+def _feed(text: str, size: int) -> list[tuple]:
+    parser = QuestionStreamParser()
+    parts = []
+    for i in range(0, len(text), size):
+        parts.extend(parser.feed(text[i : i + size]))
+    return parts
+
+
+class QuestionStreamParserTests(SimpleTestCase):
+    def test_emits_each_part_as_it_completes(self):
+        reply = json.dumps(
+            {
+                "title": 'Título com "aspas" e {chaves}',
+                "description": "Descrição",
+                "questions": [_question("Q1"), _question("Q2")],
+            }
+        )
+        # Whole and in chunks of any size, cutting strings and escapes
+        for size in (len(reply), 7, 1):
+            with self.subTest(size=size):
+                self.assertEqual(
+                    _feed(reply, size),
+                    [
+                        ("title", 'Título com "aspas" e {chaves}'),
+                        ("description", "Descrição"),
+                        ("question", _question("Q1")),
+                        ("question", _question("Q2")),
+                    ],
+                )
+
+    def test_question_emitted_before_the_end_of_the_reply(self):
+        parser = QuestionStreamParser()
+        parts = list(parser.feed('{"title": "T", "questions": [' + json.dumps(_question("Q1"))))
+        self.assertEqual(parts, [("title", "T"), ("question", _question("Q1"))])
+
+    def test_skips_malformed_question(self):
+        reply = '{"title": "T", "questions": [{"text": "x",}, ' + json.dumps(_question("Q2")) + "]}"
+        for size in (len(reply), 5):
+            with self.subTest(size=size), self.assertLogs("apps.questions.streaming", "WARNING"):
+                self.assertEqual(
+                    _feed(reply, size), [("title", "T"), ("question", _question("Q2"))]
+                )
+
+    def test_truncated_reply_keeps_complete_questions(self):
+        reply = '{"title": "T", "questions": [' + json.dumps(_question("Q1")) + ', {"text": "Q2'
+        self.assertEqual(_feed(reply, 10), [("title", "T"), ("question", _question("Q1"))])
+
+
+class ChoiceBalancerTests(SimpleTestCase):
+    def test_balances_the_index_of_the_correct_choice(self):
+        balancer = _ChoiceBalancer(20, QUESTION_CHOICES)
+        indexes = Counter()
+        for i in range(20):
+            question = Question(**_question(f"Q{i}"))
+            balancer.shuffle(question)
+            self.assertEqual(len(question.choices), QUESTION_CHOICES)
+            indexes[next(j for j, c in enumerate(question.choices) if c.is_correct)] += 1
+
+        self.assertEqual(indexes, {i: 5 for i in range(QUESTION_CHOICES)})
+
+
+class StreamProcessorTests(SimpleTestCase):
+    def _chunk(self, content: str):
+        delta = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+
+    def test_skips_invalid_questions_and_keeps_going(self):
+        no_correct = _question("Q2")
+        no_correct["choices"][0]["is_correct"] = False
+        reply = (
+            '{"title": "T", "description": "D", "questions": ['
+            + '{"text": "x",}, '
+            + json.dumps(_question("Q1"))
+            + ', {"text": "sem alternativas"}, '
+            + json.dumps(no_correct)
+            + ", "
+            + json.dumps(_question("Q3"))
+            + "]}"
+        )
+        processor = _StreamProcessor(3, GenerationStats())
+        parts = []
+        for i in range(0, len(reply), 16):
+            parts.extend(processor.feed(self._chunk(reply[i : i + 16])))
+
+        self.assertEqual(
+            [key for key, _ in parts], ["title", "description", "question", "question"]
+        )
+        self.assertEqual([q.text for q in processor.questions], ["Q1", "Q3"])
@@ -4,6 +4,15 @@ from . import views
 
 urlpatterns = [
     path("add/", views.add_question_set_view, name="add_question_set"),
+    path("queue", views.generation_queue_view, name="generation_queue"),
+    path("sidebar", views.sidebar_question_sets_view, name="sidebar_question_sets"),
+    path("batches/add/", views.add_generation_batch_view, name="add_generation_batch"),
+    path("batches/<ulid:batch_id>/", views.generation_batch_view, name="generation_batch"),
+    path(
+        "batches/<ulid:batch_id>/status",
+        views.generation_batch_status_view,
+        name="generation_batch_status",
+    ),
     path("<ulid:question_set_id>/", views.question_set_view, name="question_set"),
     path(
         "<ulid:question_set_id>/delete", views.question_set_delete_view, name="question_set_delete"
@@ -16,6 +25,14 @@ urlpatterns = [
     path(
         "<ulid:question_set_id>/status", views.question_set_status_view, name="question_set_status"
     ),
+    path(
+        "<ulid:question_set_id>/events", views.question_set_events_view, name="question_set_events"
+    ),
+    path(
+        "<ulid:question_set_id>/questions",
+        views.question_set_questions_view,
+        name="question_set_questions",
+    ),
     path(
         "<ulid:question_set_id>/start-practice",
         views.question_set_start_practice_view,
@@ -31,6 +48,11 @@ urlpatterns = [
         views.question_set_practice_view,
         name="question_set_practice",
     ),
+    path(
+        "<ulid:question_set_id>/practices/<ulid:session_id>/answers",
+        views.question_set_practice_answers_view,
+        name="question_set_practice_answers",
+    ),
     path(
         "<ulid:question_set_id>/practices/<ulid:session_id>/results",
         views.question_set_practice_results_view,
@@ -1,16 +1,36 @@
+import json
 import random
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import Prefetch
-from django.http import HttpRequest, JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db.models import Count
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 
-from .forms import QuestionSetAddForm
-from .models import PracticeAnswer, PracticeSession, Question, QuestionSet
-from .tasks import generate_questions_task
+from apps.common.markdown import render_markdown
+from apps.dashboard import stats
+
+from . import events, practice_state, scheduler, sidebar
+from .forms import GenerationBatchForm, QuestionSetAddForm
+from .models import GenerationBatch, PracticeSession, Question, QuestionSet
+from .persistence import _sequential_ulids
+from .tasks import start_queued_generations
+
+
+def _temp_title(prompt: str) -> str:
+    """Title shown while the set is generated."""
+
+    if len(prompt) > 20:
+        return prompt[:20] + "..."
+    return prompt
 
 
 @login_required
@@ -18,36 +38,26 @@ def add_question_set_view(request: HttpRequest):
     if request.method == "POST":
         form = QuestionSetAddForm(request.POST)
         if form.is_valid():
-            # Checks if the user has pending question set.
-            # Each user can only generate one set of questions at a time
-            pending = QuestionSet.objects.filter(user=request.user, status="pending").exists()
-            if pending:
-                messages.error(
-                    request, "Você já tem questões sendo geradas no momento, por favor, aguarde."
-                )
+            # Checks the daily quota and the jobs in the queue of the user
+            error = scheduler.check_admission(request.user)  # pyright: ignore[reportArgumentType]
+            if error:
+                messages.error(request, error)
             else:
                 data = form.cleaned_data
 
-                temp_title = data["prompt"]
-                if len(temp_title) > 20:
-                    temp_title = temp_title[:20] + "..."
-
                 question_set = QuestionSet.objects.create(
                     user=request.user,
                     # Temporary title
-                    title=temp_title,
+                    title=_temp_title(data["prompt"]),
                     prompt=data["prompt"],
                     status="pending",
                 )
                 question_set.save()
+                scheduler.enqueue(question_set, data["questions_number"])
 
-                # Generate questions in a background task
+                # Start the generation in a background task, if there is free capacity
                 # Use on_commit hook to avoid task run before save
-                transaction.on_commit(
-                    lambda: generate_questions_task.delay(
-                        question_set.id, data["prompt"], data["questions_number"]
-                    ),
-                )
+                transaction.on_commit(start_queued_generations)
                 return redirect("question_set", question_set_id=question_set.id)
         else:
             messages.error(request, "Não foi possível criar o conjunto de questões.")
@@ -62,15 +72,99 @@ def add_question_set_view(request: HttpRequest):
 
 
 @login_required
-def question_set_view(request: HttpRequest, question_set_id: int):
-    question_set = get_object_or_404(
-        QuestionSet.objects.prefetch_related(
-            Prefetch("questions", queryset=Question.objects.prefetch_related("choices"))
-        ),
-        id=question_set_id,
-        user=request.user,
+def add_generation_batch_view(request: HttpRequest):
+    if request.method == "POST":
+        form = GenerationBatchForm(request.POST, request.FILES)
+        if form.is_valid():
+            items = form.items
+            error = scheduler.check_batch_admission(request.user, len(items))  # pyright: ignore[reportArgumentType]
+            if error:
+                messages.error(request, error)
+            else:
+                with transaction.atomic():
+                    batch = GenerationBatch.objects.create(
+                        user=request.user,
+                        name=form.cleaned_data["file"].name[:255],
+                        total=len(items),
+                    )
+                    # Sequential ids keep the sets in the order of the file
+                    question_sets = QuestionSet.objects.bulk_create(
+                        QuestionSet(
+                            id=question_set_id,
+                            user=request.user,
+                            batch=batch,
+                            title=_temp_title(item["prompt"]),
+                            prompt=item["prompt"],
+                            status="pending",
+                        )
+                        for question_set_id, item in zip(
+                            _sequential_ulids(len(items)), items, strict=True
+                        )
+                    )
+                    scheduler.enqueue_many(
+                        question_sets, [item["questions_number"] for item in items]
+                    )
+                    # Bulk inserts don't send the signals that update the sidebar
+                    transaction.on_commit(lambda: sidebar.invalidate(request.user.id))  # pyright: ignore[reportArgumentType]
+
+                    transaction.on_commit(start_queued_generations)
+                return redirect("generation_batch", batch_id=batch.id)
+        else:
+            for error in form.errors.get("file", []):
+                messages.error(request, error)
+    else:
+        form = GenerationBatchForm()
+
+    batches = GenerationBatch.objects.filter(user=request.user)[:10]
+
+    return render(
+        request,
+        "questions/add_generation_batch.html",
+        context={"title": "Gerar em Lote", "form": form, "batches": batches},
+    )
+
+
+def _batch_progress(batch: GenerationBatch) -> dict:
+    counts = dict(
+        batch.question_sets.values("status")
+        .annotate(count=Count("id"))
+        .values_list("status", "count")
+    )
+    progress = {status: counts.get(status, 0) for status in ["pending", "success", "error"]}
+    progress["total"] = sum(progress.values())
+    progress["finished"] = progress["success"] + progress["error"]
+    progress["percent"] = (
+        int(progress["finished"] / progress["total"] * 100) if progress["total"] else 100
+    )
+    return progress
+
+
+@login_required
+def generation_batch_view(request: HttpRequest, batch_id: int):
+    batch = get_object_or_404(GenerationBatch, id=batch_id, user=request.user)
+
+    return render(
+        request,
+        "questions/generation_batch.html",
+        context={
+            "title": batch.name,
+            "batch": batch,
+            "question_sets": batch.question_sets.order_by("id"),
+            "progress": _batch_progress(batch),
+        },
     )
 
+
+@login_required
+def generation_batch_status_view(request: HttpRequest, batch_id: int):
+    batch = get_object_or_404(GenerationBatch, id=batch_id, user=request.user)
+    return JsonResponse(_batch_progress(batch))
+
+
+@login_required
+def question_set_view(request: HttpRequest, question_set_id: int):
+    question_set = get_object_or_404(QuestionSet, id=question_set_id, user=request.user)
+
     # Get current practice session
     active_practice_session = PracticeSession.objects.filter(
         question_set=question_set, finished_at=None
@@ -82,7 +176,15 @@ def question_set_view(request: HttpRequest, question_set_id: int):
         context={
             "title": question_set.title,
             "question_set": question_set,
+            # Only queried when the cached grid is missing, see QUESTION_GRID_CACHE_TTL
+            "questions": question_set.questions.order_by("id").prefetch_related("choices"),
+            "grid_cache_ttl": settings.QUESTION_GRID_CACHE_TTL,
             "active_practice_session": active_practice_session,
+            "queue_position": scheduler.queue_position(question_set.id)
+            if question_set.status == "pending"
+            else None,
+            # Under WSGI, each open stream would hold a worker thread until the set finishes
+            "use_events": isinstance(request, ASGIRequest),
         },
     )
 
@@ -110,9 +212,80 @@ def question_set_toggle_pin_view(request: HttpRequest, question_set_id: int):
 
 
 @login_required
-def question_set_status_view(request: HttpRequest, question_set_id: int):
+async def question_set_status_view(request: HttpRequest, question_set_id: int):
+    user = await request.auser()
+    question_set = await aget_object_or_404(QuestionSet, user=user, id=question_set_id)
+    return JsonResponse(
+        {
+            "status": question_set.status,
+            "questions_count": await question_set.questions.acount(),
+            "queue_position": await sync_to_async(scheduler.queue_position)(question_set.id),
+        }
+    )
+
+
+@login_required
+async def question_set_events_view(request: HttpRequest, question_set_id: int):
+    """Push the status of the set with Server-Sent Events, instead of polling.
+    Only served under ASGI, where an open stream doesn't hold a worker thread. Under WSGI,
+    the stream would be consumed whole before sending anything, so the page polls instead.
+    """
+
+    if not isinstance(request, ASGIRequest):
+        # 204 tells the browser to not reconnect
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    question_set = await aget_object_or_404(QuestionSet, user=user, id=question_set_id)
+    return StreamingHttpResponse(
+        events.stream(question_set.id),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@staff_member_required
+def generation_queue_view(request: HttpRequest):
+    """Depth of the generation queue, for monitoring and autoscaling."""
+
+    return JsonResponse(scheduler.queue_stats())
+
+
+@login_required
+def question_set_questions_view(request: HttpRequest, question_set_id: int):
+    """Render the question cards after `offset`.
+    Used to show the questions while they are being generated.
+    """
+
     question_set = get_object_or_404(QuestionSet, user=request.user, id=question_set_id)
-    return JsonResponse({"status": question_set.status})
+    try:
+        offset = max(int(request.GET.get("offset", 0)), 0)
+    except ValueError:
+        offset = 0
+
+    questions = question_set.questions.order_by("id").prefetch_related("choices")[offset:]
+
+    return render(
+        request,
+        "questions/components/question_cards.html",
+        context={"questions": questions, "offset": offset},
+    )
+
+
+@login_required
+def sidebar_question_sets_view(request: HttpRequest):
+    """Render the next sets of the sidebar, for "load more"."""
+
+    try:
+        offset = max(int(request.GET.get("offset", 0)), 0)
+    except ValueError:
+        offset = 0
+
+    return render(
+        request,
+        "questions/components/question_set_nav_links.html",
+        context={"page": sidebar.get_page(request.user.id, offset), "offset": offset},  # pyright: ignore[reportArgumentType]
+    )
 
 
 @login_required
@@ -120,7 +293,7 @@ def user_practices_view(request: HttpRequest):
     sessions = (
         PracticeSession.objects.filter(question_set__user=request.user)
         .order_by("finished_at")
-        .prefetch_related("question_set")
+        .select_related("question_set")
     )
 
     return render(
@@ -144,6 +317,9 @@ def question_set_start_practice_view(request: HttpRequest, question_set_id: int)
         },
     )
 
+    if created:
+        stats.add(request.user.id, practices_count=1)
+
     # No order or restart
     if created or not session.questions_order:
         questions = list(question_set.questions.values_list("id", flat=True))  # pyright: ignore[reportAttributeAccessIssue]
@@ -155,128 +331,138 @@ def question_set_start_practice_view(request: HttpRequest, question_set_id: int)
     return redirect("question_set_practice", question_set_id=question_set.id, session_id=session.id)
 
 
+def _practice_payload(session: PracticeSession) -> dict:
+    """Everything the practice page needs, so it navigates without requests.
+    The correct choices are only sent on the results page.
+    """
+
+    questions = Question.objects.prefetch_related("choices").in_bulk(session.questions_order)
+    answers, current_index = practice_state.load(session)
+    return {
+        "questions": [
+            {
+                "id": question.id,
+                "text_html": question.text_html or render_markdown(question.text),
+                "choices": [
+                    {"id": choice.id, "text": choice.text} for choice in question.choices.all()
+                ],
+            }
+            for question_id in session.questions_order
+            if (question := questions.get(question_id)) is not None
+        ],
+        "answers": answers,
+        "current_index": current_index,
+    }
+
+
 @login_required
-def question_set_practice_view(request: HttpRequest, question_set_id: int, session_id: int):
-    session = get_object_or_404(
-        PracticeSession,
+async def question_set_practice_view(request: HttpRequest, question_set_id: int, session_id: int):
+    user = await request.auser()
+    session = await aget_object_or_404(
+        PracticeSession.objects.select_related("question_set"),
         id=session_id,
         question_set_id=question_set_id,
-        question_set__user=request.user,
+        question_set__user=user,
     )
-
-    question_id = session.questions_order[session.current_index]
-    question = Question.objects.prefetch_related("choices").get(id=question_id)
-
-    if request.method == "POST":
-        choice_id = request.POST.get("choice")
-        if choice_id is not None:
-            PracticeAnswer.objects.update_or_create(
-                session=session,
-                question=question,
-                defaults={"choice_id": choice_id},
-            )
-
-        if "next" in request.POST:
-            session.current_index = min(session.current_index + 1, len(session.questions_order) - 1)
-        elif "previous" in request.POST:
-            session.current_index = max(session.current_index - 1, 0)
-        elif "finish" in request.POST:
-            # check if all questions have been answered
-            unanswered_index = session.get_next_unanswered_index()
-            if unanswered_index is not None:
-                session.current_index = unanswered_index
-                messages.error(request, "Por favor, responda essa questão antes de finalizar.")
-            else:
-                session.finished_at = timezone.now()
-                session.save()
-                return redirect(
-                    "question_set_practice_results",
-                    question_set_id=session.question_set.id,
-                    session_id=session.id,
-                )
-
-        session.save()
+    if session.finished_at is not None:
         return redirect(
-            "question_set_practice", question_set_id=session.question_set.id, session_id=session.id
+            "question_set_practice_results", question_set_id=question_set_id, session_id=session.id
         )
 
-    answer = session.answers.filter(question=question).first()  # pyright: ignore[reportAttributeAccessIssue]
-    selected_choice_id = answer.choice.id if answer else None
-    progress = int(((session.current_index + 1) / len(session.questions_order)) * 100)
-
-    return render(
+    # The templates and context processors use the sync ORM
+    return await sync_to_async(render)(
         request,
         "questions/practice.html",
         context={
-            "question": question,
             "session": session,
-            "selected_choice_id": selected_choice_id,
-            "progress": int(progress),
+            "practice": await sync_to_async(_practice_payload)(session),
         },
     )
 
 
 @login_required
-def question_set_practice_results_view(request: HttpRequest, question_set_id: int, session_id: int):
-    session = get_object_or_404(
-        PracticeSession.objects.exclude(
-            finished_at__isnull=True,
-        ).prefetch_related(
-            Prefetch(
-                "answers",
-                queryset=PracticeAnswer.objects.prefetch_related("question"),
-            ),
-            Prefetch(
-                "question_set",
-                queryset=QuestionSet.objects.prefetch_related(
-                    Prefetch(
-                        "questions",
-                        queryset=Question.objects.prefetch_related("choices"),
-                    )
-                ),
-            ),
-        ),
+@require_POST
+async def question_set_practice_answers_view(
+    request: HttpRequest, question_set_id: int, session_id: int
+):
+    """Checkpoint of the answers of the practice page, also used to finish it.
+
+    Body: {"answers": {question_id: choice_id}, "current_index": 0, "finish": false}
+    """
+
+    user = await request.auser()
+    session = await aget_object_or_404(
+        PracticeSession,
         id=session_id,
         question_set_id=question_set_id,
+        question_set__user=user,
+        finished_at=None,
     )
-    answers = session.answers
-    question_set = session.question_set
-
-    duration = session.finished_at - session.created_at
-
-    answers = {a.question.id: a for a in session.answers.all()}
 
-    results = []
-    correct = 0
-    for q_id in session.questions_order:
-        question = next(q for q in question_set.questions.all() if q.id == q_id)
-        answer = answers[q_id]
-        is_correct = answer.choice.is_correct
-
-        if is_correct:
-            correct += 1
+    try:
+        data = json.loads(request.body)
+        answers = {str(k): str(v) for k, v in data.get("answers", {}).items()}
+        current_index = int(data.get("current_index", session.current_index))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"error": "Dados inválidos."}, status=400)
+
+    # Kept in Redis, written to the database by the beat task or when finishing
+    current_index = min(max(current_index, 0), len(session.questions_order) - 1)
+    await practice_state.aupdate(session.id, answers, current_index)
+
+    if data.get("finish"):
+        unanswered_index = await sync_to_async(practice_state.finish)(session)
+        if unanswered_index is not None:
+            await practice_state.aupdate(session.id, {}, unanswered_index)
+            return JsonResponse(
+                {
+                    "error": "Por favor, responda essa questão antes de finalizar.",
+                    "current_index": unanswered_index,
+                },
+                status=400,
+            )
 
-        results.append(
+        return JsonResponse(
             {
-                "question": question,
-                "selected_choice": answer.choice,
-                "is_correct": is_correct,
+                "redirect": reverse(
+                    "question_set_practice_results",
+                    kwargs={"question_set_id": question_set_id, "session_id": session.id},
+                ),
             }
         )
 
+    return JsonResponse({"saved": len(answers)})
+
+
+@login_required
+def question_set_practice_results_view(request: HttpRequest, question_set_id: int, session_id: int):
+    session = get_object_or_404(
+        PracticeSession.objects.exclude(finished_at__isnull=True).select_related("question_set"),
+        id=session_id,
+        question_set_id=question_set_id,
+        question_set__user=request.user,
+    )
+    # Sessions finished before the results were stored
+    if session.results is None:
+        session.store_results()
+
+    questions = Question.objects.prefetch_related("choices").in_bulk(
+        [result["question_id"] for result in session.results]
+    )
+    # Questions deleted after the practice are left out
+    results = [
+        {**result, "question": questions[result["question_id"]]}
+        for result in session.results
+        if result["question_id"] in questions
+    ]
+
     return render(
         request,
         "questions/practice_results.html",
         context={
             "title": "Resultados da prática",
             "session": session,
-            "question_set": question_set,
-            "duration": duration,
+            "question_set": session.question_set,
             "results": results,
-            "stats": {
-                "correct": correct,
-                "total": len(results),
-                "percent": correct / len(results) * 100,
-            },
         },
     )
@@ -0,0 +1,17 @@
+"""
+ASGI config for project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Served with `gunicorn core.asgi` and the uvicorn workers, see gunicorn.conf.py.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+application = get_asgi_application()
@@ -33,6 +33,10 @@ DEBUG = env("DEBUG")
 
 ALLOWED_HOSTS = env("ALLOWED_HOSTS")
 
+# Production serving profile, used with gunicorn (see gunicorn.conf.py). Turns on the
+# persistent database connections and the cached sessions.
+PRODUCTION = env.bool("PRODUCTION", default=False)
+
 
 # Application definition
 INSTALLED_APPS = [
@@ -52,6 +56,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Serve the static files from the app process, before the other middlewares
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # Compress the HTML and JSON responses
+    "django.middleware.gzip.GZipMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -99,6 +107,13 @@ DATABASES = {
         "PORT": env("MYSQL_PORT"),
         "USER": env("MYSQL_USER"),
         "PASSWORD": env("MYSQL_PASSWORD"),
+        # Reuse the connections between requests, checking them before each request.
+        # Only for the WSGI deployment (GUNICORN_WORKER_CLASS=gthread), ex: 60. Under ASGI,
+        # the default of the Docker image, the sync code of each request runs in a new thread
+        # with its own connection, so the persistent connections would pile up.
+        # https://docs.djangoproject.com/en/5.2/ref/databases/#persistent-connections
+        "CONN_MAX_AGE": env.int("MYSQL_CONN_MAX_AGE", default=0),
+        "CONN_HEALTH_CHECKS": PRODUCTION,
     }
 }
 
@@ -161,7 +176,9 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 STORAGES = {
     "staticfiles": {
-        "BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage",
+        # Hashed names like ManifestStaticFilesStorage, plus gzip and brotli versions
+        # created by collectstatic. The hashed files are cached forever (immutable).
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
 }
 
@@ -184,6 +201,102 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 
+CELERY_BEAT_SCHEDULE = {
+    # Safety net for the jobs not started on submit or completion
+    "drain-generation-queue": {
+        "task": "apps.questions.tasks.drain_generation_queue_task",
+        "schedule": 10.0,
+    },
+    # Write the practice answers kept in Redis to the database
+    "flush-practice-states": {
+        "task": "apps.questions.tasks.flush_practice_states_task",
+        "schedule": 30.0,
+    },
+    # Merge the activity rows added by the finished practices
+    "compact-daily-activity": {
+        "task": "apps.dashboard.tasks.compact_daily_activity_task",
+        "schedule": 10 * 60.0,
+    },
+}
+
+REDIS_URL = env("REDIS_URL", default=CELERY_BROKER_URL)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "cache",
+    }
+}
+
+if PRODUCTION:
+    # Read the sessions from the cache, falling back to the database
+    SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+# Time the rendered question grid of a finished set is kept in the cache
+QUESTION_GRID_CACHE_TTL = env.int("QUESTION_GRID_CACHE_TTL", default=60 * 60 * 24)  # Seconds
+# The state of the active practices is kept in Redis and written to the database when
+# finished, after being idle for the timeout or at the interval, whichever comes first
+PRACTICE_STATE_IDLE_TIMEOUT = env.int("PRACTICE_STATE_IDLE_TIMEOUT", default=60)  # Seconds
+PRACTICE_STATE_FLUSH_INTERVAL = env.int("PRACTICE_STATE_FLUSH_INTERVAL", default=5 * 60)  # Seconds
+
 AI_SERVICE_API_KEY = env("AI_SERVICE_API_KEY")
 AI_SERVICE_BASE_URL = env("AI_SERVICE_BASE_URL")
 AI_SERVICE_MODEL = env("AI_SERVICE_MODEL")
+# OpenAI compatible backends the generations are routed to, by latency and error rate.
+# Defaults to the single AI_SERVICE_* backend. Ex:
+# [{"name": "deepseek", "base_url": "https://api.deepseek.com", "api_key": "...",
+#   "model": "deepseek-chat"}, ...]
+AI_SERVICE_BACKENDS = env.json("AI_SERVICE_BACKENDS", default=[])
+# Send a slow request also to the next backend after the p95 latency of the first one.
+# Only the async executor hedges, it can cancel the losing request.
+AI_SERVICE_HEDGING = env.bool("AI_SERVICE_HEDGING", default=False)
+# Consecutive failures that stop the requests to a backend for the cooldown
+AI_SERVICE_BREAKER_FAILURES = env.int("AI_SERVICE_BREAKER_FAILURES", default=5)
+AI_SERVICE_BREAKER_COOLDOWN = env.int("AI_SERVICE_BREAKER_COOLDOWN", default=30)  # Seconds
+# Save the questions as they arrive from the model instead of waiting the full reply
+AI_SERVICE_STREAM = env.bool("AI_SERVICE_STREAM", default=True)
+# Sets with more questions than this are generated in parallel shards of this size
+AI_SERVICE_SHARD_SIZE = env.int("AI_SERVICE_SHARD_SIZE", default=10)
+# "json_object" or "json_schema" (strict schema derived from the response models,
+# when supported by the provider)
+AI_SERVICE_RESPONSE_FORMAT = env("AI_SERVICE_RESPONSE_FORMAT", default="json_object")
+# Requests for the questions missing in an invalid or truncated reply
+AI_SERVICE_REPAIR_ATTEMPTS = env.int("AI_SERVICE_REPAIR_ATTEMPTS", default=1)
+# Where the generations run: "celery" (one generation per worker process) or
+# "async" (many generations per process, run with `manage.py run_generation_executor`)
+AI_SERVICE_EXECUTOR = env("AI_SERVICE_EXECUTOR", default="celery")
+# Max generations in flight in each async executor process
+AI_SERVICE_EXECUTOR_CONCURRENCY = env.int("AI_SERVICE_EXECUTOR_CONCURRENCY", default=50)
+# Provider limits by model, shared by all the workers. Ex:
+# {"deepseek-chat": {"rpm": 500, "tpm": 1000000, "concurrency": 20}}
+AI_SERVICE_RATE_LIMITS = env.json("AI_SERVICE_RATE_LIMITS", default={})
+# Max time a generation waits for capacity
+AI_SERVICE_RATE_LIMIT_TIMEOUT = env.int("AI_SERVICE_RATE_LIMIT_TIMEOUT", default=600)  # Seconds
+# Retries of the requests rejected by the provider with 429
+AI_SERVICE_RATE_LIMIT_RETRIES = env.int("AI_SERVICE_RATE_LIMIT_RETRIES", default=5)
+# Prices in USD per million tokens by model, used in the generation telemetry. Ex:
+# {"deepseek-chat": {"input": 0.27, "output": 1.10}}
+AI_SERVICE_PRICING = env.json("AI_SERVICE_PRICING", default={})
+
+# Reuse the questions generated for the same prompt, number of questions and model
+GENERATION_CACHE_ENABLED = env.bool("GENERATION_CACHE_ENABLED", default=True)
+GENERATION_CACHE_TTL = env.int("GENERATION_CACHE_TTL", default=60 * 60 * 24 * 7)  # Seconds
+GENERATION_CACHE_MAX_ENTRIES = env.int("GENERATION_CACHE_MAX_ENTRIES", default=10000)
+# Max time to wait for an identical generation in flight
+GENERATION_CACHE_WAIT_TIMEOUT = env.int("GENERATION_CACHE_WAIT_TIMEOUT", default=180)  # Seconds
+
+# Generation scheduler. Jobs are queued per user and started round-robin.
+# Max generations running at the same time, sized for the workers
+GENERATION_MAX_RUNNING = env.int("GENERATION_MAX_RUNNING", default=20)
+# Max generations running at the same time for each user
+GENERATION_USER_CONCURRENCY = env.int("GENERATION_USER_CONCURRENCY", default=1)
+# Max generations queued or running for each user
+GENERATION_USER_MAX_JOBS = env.int("GENERATION_USER_MAX_JOBS", default=5)
+# Max generations per user each day, 0 for no limit
+GENERATION_USER_DAILY_QUOTA = env.int("GENERATION_USER_DAILY_QUOTA", default=30)
+# Max generations running at the same time for each batch
+GENERATION_BATCH_CONCURRENCY = env.int("GENERATION_BATCH_CONCURRENCY", default=5)
+# Max question sets in a batch
+GENERATION_BATCH_MAX_SIZE = env.int("GENERATION_BATCH_MAX_SIZE", default=50)
+# Running jobs older than it are considered lost (ex: the worker died)
+GENERATION_JOB_TIMEOUT = env.int("GENERATION_JOB_TIMEOUT", default=30 * 60)  # Seconds
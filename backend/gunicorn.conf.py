@@ -0,0 +1,39 @@
+"""
+Gunicorn config, loaded from the working directory by `gunicorn core.asgi` (the Docker
+image) or `gunicorn core.wsgi`.
+
+By default each worker process runs the ASGI app in an event loop with uvicorn, so the
+slow clients and the open event streams don't hold a thread. With
+GUNICORN_WORKER_CLASS=gthread, for `core.wsgi`, each process serves the requests in
+threads instead. The app is loaded before forking the workers, so they share its memory
+until they write to it (copy-on-write).
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+if worker_class == "gthread":
+    default_workers = multiprocessing.cpu_count() * 2 + 1
+else:
+    # A single event loop already keeps the CPU busy while the requests wait
+    default_workers = multiprocessing.cpu_count() + 1
+workers = int(os.environ.get("GUNICORN_WORKERS", default_workers))
+# Only used by gthread
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Load Django once in the master process
+preload_app = True
+
+# Restart the workers from time to time, in case of memory leaks
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
@@ -25,3 +25,35 @@ document.addEventListener("DOMContentLoaded", () => {
     sidebar.classList.add("collapsed");
   }
 });
+
+// The question sets of the sidebar are cached for all the pages of the user,
+// so the active link and the CSRF token of the forms are set here
+function setupSidebarQuestionSets() {
+  for (const link of document.querySelectorAll("[data-sidebar-question-sets] .nav-link")) {
+    const anchor = link.querySelector("a");
+    link.classList.toggle("active", anchor.getAttribute("href") === window.location.pathname);
+  }
+}
+
+document.addEventListener("DOMContentLoaded", setupSidebarQuestionSets);
+
+document.addEventListener("submit", (event) => {
+  const form = event.target;
+  if (!form.closest("[data-sidebar-question-sets]") || form.elements.csrfmiddlewaretoken) {
+    return;
+  }
+  const token = document.querySelector("input[name=csrfmiddlewaretoken]");
+  form.appendChild(token.cloneNode());
+});
+
+document.addEventListener("click", async (event) => {
+  const button = event.target.closest("[data-sidebar-more]");
+  if (!button) {
+    return;
+  }
+  button.disabled = true;
+  const resp = await fetch(button.dataset.sidebarMore);
+  button.insertAdjacentHTML("afterend", await resp.text());
+  button.remove();
+  setupSidebarQuestionSets();
+});